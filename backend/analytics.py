@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Period frequencies of the supported intervals; weeks run Monday to Sunday
+INTERVALS = {"month": "M", "week": "W-SUN"}
+DIMENSIONS = ("category", "merchant")
+
+
+def transactions_frame(transactions: List[Dict[str, Any]]) -> pd.DataFrame:
+    """One row per dated transaction, sorted by date, with month and week periods precomputed.
+
+    category is the first category level (as in the summary) and merchant is
+    merchant_name, falling back to the transaction name. Amounts keep Plaid's
+    sign: positive is money out.
+    """
+    frame = pd.DataFrame({
+        "date": pd.to_datetime([t.get("date") for t in transactions], format="%Y-%m-%d", errors="coerce"),
+        "amount": pd.to_numeric([t.get("amount") for t in transactions], errors="coerce"),
+        "category": [(t.get("category") or ["Uncategorized"])[0] for t in transactions],
+        "merchant": [t.get("merchant_name") or t.get("name") or "Unknown" for t in transactions],
+        "account_id": [t.get("account_id") for t in transactions],
+    })
+    frame = frame.dropna(subset=["date"]).fillna({"amount": 0.0})
+    frame = frame.sort_values("date", kind="stable").reset_index(drop=True)
+    for dimension in DIMENSIONS + ("account_id",):
+        frame[dimension] = frame[dimension].astype("category")
+    for interval, freq in INTERVALS.items():
+        frame[interval] = frame["date"].dt.to_period(freq)
+    return frame
+
+
+def _between(frame: pd.DataFrame, start_date: Optional[date], end_date: Optional[date]) -> pd.DataFrame:
+    """Rows dated within [start_date, end_date]; the frame is sorted, so this is two binary searches"""
+    dates = frame["date"].values
+    lo = 0 if start_date is None else dates.searchsorted(np.datetime64(start_date, "ns"), side="left")
+    hi = len(frame) if end_date is None else dates.searchsorted(np.datetime64(end_date, "ns"), side="right")
+    return frame.iloc[lo:hi]
+
+
+def _values(series: pd.Series) -> List[Optional[float]]:
+    """Round to cents for JSON, with NaN and infinities (no previous period, division by zero) as null"""
+    values = series.to_numpy(dtype=float).round(2).astype(object)
+    values[~np.isfinite(series.to_numpy(dtype=float))] = None
+    return values.tolist()
+
+
+def _period_labels(periods: pd.PeriodIndex, interval: str) -> List[str]:
+    """YYYY-MM for months, the Monday a week starts on for weeks"""
+    if interval == "month":
+        return list(periods.strftime("%Y-%m"))
+    return list(periods.start_time.strftime("%Y-%m-%d"))
+
+
+def _describe(amounts: pd.Series, window: int) -> Dict[str, Any]:
+    return {
+        "total": round(float(amounts.sum()), 2),
+        "amounts": _values(amounts),
+        "rolling_average": _values(amounts.rolling(window, min_periods=1).mean()),
+        "change": _values(amounts.diff()),
+        "change_pct": _values(amounts.pct_change(fill_method=None) * 100),
+    }
+
+
+def spending_series(frame: pd.DataFrame, interval: str = "month", by: str = "category",
+                    start_date: Optional[date] = None, end_date: Optional[date] = None,
+                    window: int = 3, limit: int = 10) -> Dict[str, Any]:
+    """Per-period totals of each `by` value, with rolling averages and period-over-period changes.
+
+    Every period in the range is present (with 0 where nothing was spent),
+    so series line up. The `limit` values with the largest totals get their
+    own series; the rest are summed into "Other". "total" covers all rows.
+    """
+    rows = _between(frame, start_date, end_date)
+    freq = INTERVALS[interval]
+    first = pd.Period(start_date, freq) if start_date else (rows[interval].iloc[0] if len(rows) else None)
+    last = pd.Period(end_date, freq) if end_date else (rows[interval].iloc[-1] if len(rows) else None)
+    periods = pd.period_range(first, last, freq=freq) if first is not None else pd.PeriodIndex([], freq=freq)
+
+    table = (rows.groupby([interval, by], observed=True)["amount"].sum()
+             .unstack(fill_value=0.0)
+             .reindex(periods, fill_value=0.0))
+    totals = table.sum().sort_values(ascending=False)
+    kept = totals.index[:limit]
+    series = [{"key": key, **_describe(table[key], window)} for key in kept]
+    if len(totals) > limit:
+        series.append({"key": "Other", **_describe(table.drop(columns=kept).sum(axis=1), window)})
+
+    return {
+        "interval": interval,
+        "by": by,
+        "window": window,
+        "periods": _period_labels(periods, interval),
+        "total": _describe(table.sum(axis=1), window),
+        "series": series,
+    }
+
+
+def top_merchants(frame: pd.DataFrame, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                  limit: int = 10) -> Dict[str, Any]:
+    """Merchants with the most money out in the range, with counts, averages and each one's top category"""
+    rows = _between(frame, start_date, end_date)
+    spending = rows[rows["amount"] > 0]
+    grouped = spending.groupby("merchant", observed=True)
+    stats = grouped["amount"].agg(["sum", "count", "mean"]).join(grouped["date"].agg(["min", "max"]))
+    stats = stats.nlargest(limit, "sum")
+    top_category = (spending[spending["merchant"].isin(stats.index)]
+                    .groupby(["merchant", "category"], observed=True)["amount"].sum()
+                    .groupby(level="merchant", observed=True).idxmax())
+    total_spent = float(spending["amount"].sum())
+    return {
+        "total_spent": round(total_spent, 2),
+        "merchants": [
+            {
+                "merchant": merchant,
+                "total": round(float(row["sum"]), 2),
+                "count": int(row["count"]),
+                "average": round(float(row["mean"]), 2),
+                "share": round(float(row["sum"]) / total_spent, 4) if total_spent else None,
+                "first_date": row["min"].date().isoformat(),
+                "last_date": row["max"].date().isoformat(),
+                "top_category": top_category[merchant][1],
+            }
+            for merchant, row in stats.iterrows()
+        ],
+    }
+
+
+def monthly_totals(frame: pd.DataFrame, by: str = "category") -> Dict[str, Dict[str, float]]:
+    """Net amount per month ("YYYY-MM") for each `by` value, for months that have any rows"""
+    sums = frame.groupby([by, "month"], observed=True)["amount"].sum()
+    totals: Dict[str, Dict[str, float]] = {}
+    for (key, month), amount in zip(sums.index, sums.to_numpy().tolist()):
+        totals.setdefault(key, {})[str(month)] = amount
+    return totals
+
+
+class FrameCache:
+    """Per-user transaction DataFrames, each tagged with the data version it was built from.
+
+    A save bumps the user's version, so the next lookup rebuilds the frame;
+    only the newest frame per user is kept, in an LRU bounded by entry count
+    and total bytes.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[int, int, pd.DataFrame]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, version: int, load: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """The user's frame for this data version, calling load() to build it if it is not cached.
+
+        Frames are shared between callers and must not be mutated.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        frame = load()
+        size = int(frame.memory_usage(index=True).sum())
+        with self._lock:
+            old = self._entries.get(user_id)
+            # A concurrent load may have cached a newer version meanwhile
+            if old is not None and old[0] > version:
+                return frame
+            if old is not None:
+                self._bytes -= self._entries.pop(user_id)[1]
+            if size <= self.max_bytes and self.max_entries > 0:
+                self._entries[user_id] = (version, size, frame)
+                self._bytes += size
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted[1]
+        return frame
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current usage"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
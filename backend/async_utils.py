@@ -0,0 +1,47 @@
+import asyncio
+import contextvars
+import functools
+import random
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def run_in_executor(executor: Executor, func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking call on the given executor without blocking the event loop.
+
+    The call runs in a copy of the caller's context, as with asyncio.to_thread,
+    so context variables such as the request's profile follow it.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with jitter: half the capped delay plus a random share of the other half"""
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def retry_async(func: Callable[[], Awaitable[T]], should_retry: Callable[[Exception], bool],
+                      attempts: int = 3, base_delay: float = 2.0, max_delay: float = 30.0) -> T:
+    """Await func(), retrying with exponential backoff while should_retry(error) is true.
+
+    The last error is re-raised once attempts are exhausted, and errors for
+    which should_retry is false are raised immediately.
+    """
+    for attempt in range(attempts):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt == attempts - 1 or not should_retry(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.info(f"Attempt {attempt + 1}/{attempts} failed, retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+    raise ValueError("attempts must be at least 1")
@@ -0,0 +1,46 @@
+"""Measure full-history transaction ingestion against the fake Plaid client.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ingest --transactions 50000 --latency 0.05
+"""
+import argparse
+import logging
+import tempfile
+import time
+from datetime import date, timedelta
+
+from data_storage import DataStorage
+from fake_plaid import FakePlaidClient
+from transaction_ingest import fetch_all_transactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per Plaid call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    client = FakePlaidClient(args.transactions, args.accounts, latency=args.latency)
+    end_date = date.today()
+    start_date = end_date - timedelta(days=365 * 5)
+    storage = DataStorage(tempfile.mkdtemp(prefix="bench_ingest_"))
+
+    print(f"{'workers':>7} {'pages':>6} {'rows':>7} {'fetch (s)':>9} {'save (s)':>8} {'rows/s':>9}")
+    for workers in args.workers:
+        started = time.perf_counter()
+        transactions, stats = fetch_all_transactions(
+            client, "access-fake", start_date, end_date, max_workers=workers
+        )
+        fetched = time.perf_counter()
+        storage.save_transactions("bench_user", transactions)
+        saved = time.perf_counter()
+        print(f"{workers:>7} {stats['pages']:>6} {stats['transactions']:>7} {fetched - started:>9.2f} "
+              f"{saved - fetched:>8.2f} {stats['transactions'] / (saved - started):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compare JSON serialization and gzip for a 5-year /summary payload.
+
+"fastapi default" is what a dict returned from a route used to cost:
+jsonable_encoder followed by JSONResponse.render. The other rows are the
+dumps() used by FastJSONResponse, with orjson and with its stdlib fallback.
+Wire sizes are for the uncompressed body and for gzip at the given levels.
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization --transactions 20000
+"""
+import argparse
+import gzip
+import logging
+import time
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import responses
+from data_storage import TransactionIndex, build_account_summary
+from synthetic import generate_accounts, generate_transactions
+
+
+def best_of(repeat: int, func, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def stdlib_dumps(content) -> bytes:
+    orjson, responses.orjson = responses.orjson, None
+    try:
+        return responses.dumps(content)
+    finally:
+        responses.orjson = orjson
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    accounts = generate_accounts(args.accounts)
+    transactions = TransactionIndex(generate_transactions(accounts, args.transactions, years=5)).all()
+    end_date = date.today()
+    start_date = end_date - timedelta(days=365 * 5)
+    print(f"{args.transactions} transactions, {args.accounts} accounts, {start_date} to {end_date}; "
+          f"orjson {'installed' if responses.orjson is not None else 'not installed'}")
+
+    encoders = [("fastapi default", lambda content: JSONResponse(jsonable_encoder(content)).body),
+                ("stdlib dumps", stdlib_dumps)]
+    if responses.orjson is not None:
+        encoders.append(("orjson dumps", responses.dumps))
+
+    for detail in ("full", "lean"):
+        summary = build_account_summary(accounts, transactions, detail=detail)
+        body = responses.dumps(summary)
+        print(f"\n{detail} summary: {len(body) / 1e3:.1f} KB uncompressed")
+        print(f"{'encoder':>16} {'serialize (ms)':>15}")
+        for name, encode in encoders:
+            print(f"{name:>16} {best_of(args.repeat, encode, summary) * 1000:>15.1f}")
+        print(f"{'gzip level':>16} {'compress (ms)':>15} {'wire (KB)':>10} {'ratio':>6}")
+        for level in args.levels:
+            compressed = gzip.compress(body, compresslevel=level)
+            elapsed = best_of(args.repeat, gzip.compress, body, level)
+            print(f"{level:>16} {elapsed * 1000:>15.1f} {len(compressed) / 1e3:>10.1f} "
+                  f"{len(body) / len(compressed):>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
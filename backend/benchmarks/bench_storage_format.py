@@ -0,0 +1,119 @@
+"""Compare the legacy indented-JSON transaction file with NDJSON snapshots (plain and gzip).
+
+Reports file size, time to load every row, time to read the most recent
+90 days, and the peak RSS growth of each load measured in a fresh process.
+
+Run from the backend directory:
+    python -m benchmarks.bench_storage_format --transactions 100000
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from datetime import date, timedelta
+
+from data_storage import DataStorage, TransactionIndex, iter_snapshot
+from synthetic import generate_accounts, generate_transactions
+
+
+def load_all(fmt: str, path: str) -> int:
+    if fmt == "legacy json":
+        with open(path, 'r') as f:
+            return len(json.load(f)["transactions"])
+    # Keep every row, as building the index does
+    return len(list(iter_snapshot(path)))
+
+
+def load_recent(fmt: str, path: str, start_date: date) -> int:
+    start = start_date.isoformat()
+    if fmt == "legacy json":
+        # The whole document has to be parsed before anything can be filtered
+        with open(path, 'r') as f:
+            return sum(1 for t in json.load(f)["transactions"] if t["date"] >= start)
+    count = 0
+    for transaction in iter_snapshot(path):
+        if transaction["date"] < start:
+            break
+        count += 1
+    return count
+
+
+def best_of(repeat: int, func, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def write_files(args: argparse.Namespace, directory: str) -> dict:
+    """Write the same transactions in each format; return {format: path}"""
+    accounts = generate_accounts(args.accounts)
+    rows = TransactionIndex(generate_transactions(accounts, args.transactions, years=args.years)).all()
+
+    paths = {"legacy json": os.path.join(directory, "legacy.json")}
+    with open(paths["legacy json"], 'w') as f:
+        json.dump({"last_updated": "", "transactions": rows}, f, indent=2)
+    for fmt, compress in (("ndjson", False), ("ndjson.gz", True)):
+        paths[fmt] = os.path.join(directory, f"snapshot.{fmt}")
+        started = time.perf_counter()
+        DataStorage(directory, compress_snapshots=compress)._write_snapshot(paths[fmt], rows)
+        print(f"wrote {fmt} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return paths
+
+
+def _child(queue, func, args) -> None:
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = func(*args)
+    queue.put((result, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before))
+
+
+def in_child(func, *args):
+    """Run func(*args) in a fresh process; return its result and peak RSS growth in MB.
+
+    A forked child inherits the parent's RSS high-water mark, so the parent
+    never holds the data itself.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, func, args))
+    process.start()
+    result, growth = queue.get()
+    process.join()
+    return result, growth / 1024  # ru_maxrss is in KB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    paths, _ = in_child(write_files, args, tempfile.mkdtemp(prefix="bench_format_"))
+
+    start_date = date.today() - timedelta(days=90)
+    # Measure memory before timing anything here, while this process is still small
+    rss = {fmt: (in_child(load_all, fmt, path)[1], in_child(load_recent, fmt, path, start_date)[1])
+           for fmt, path in paths.items()}
+
+    print(f"{args.transactions} transactions, recent = since {start_date}")
+    print(f"{'format':>12} {'size (MB)':>10} {'load all (ms)':>14} {'recent (ms)':>12} "
+          f"{'RSS all (MB)':>13} {'RSS recent (MB)':>16}")
+    for fmt, path in paths.items():
+        print(f"{fmt:>12} {os.path.getsize(path) / 1e6:>10.1f} "
+              f"{best_of(args.repeat, load_all, fmt, path) * 1000:>14.0f} "
+              f"{best_of(args.repeat, load_recent, fmt, path, start_date) * 1000:>12.1f} "
+              f"{rss[fmt][0]:>13.1f} {rss[fmt][1]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
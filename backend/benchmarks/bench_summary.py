@@ -0,0 +1,42 @@
+"""Show that build_account_summary scales linearly with the number of transactions.
+
+Run from the backend directory:
+    python -m benchmarks.bench_summary
+"""
+import argparse
+import logging
+import time
+
+from data_storage import build_account_summary
+from synthetic import generate_accounts, generate_transactions
+
+
+def time_summary(accounts, transactions, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        build_account_summary(accounts, transactions)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[12500, 25000, 50000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # The summary logs per-institution details at INFO; keep them out of the timings
+    logging.basicConfig(level=logging.WARNING)
+
+    accounts = generate_accounts(args.accounts)
+    print(f"{'transactions':>12} {'accounts':>8} {'best (ms)':>10} {'ns/txn':>8}")
+    for size in args.sizes:
+        transactions = generate_transactions(accounts, size)
+        elapsed = time_summary(accounts, transactions, args.repeat)
+        print(f"{size:>12} {args.accounts:>8} {elapsed * 1000:>10.1f} {elapsed / size * 1e9:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
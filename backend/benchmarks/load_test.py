@@ -0,0 +1,284 @@
+"""Drive the API with concurrent simulated dashboard users and report throughput and latency percentiles.
+
+Targets:
+  inprocess  the app in this process through httpx's ASGI transport (default).
+             Event-loop lag is sampled meanwhile, so blocking calls show up;
+             the load generator shares that loop, which adds to the lag.
+  uvicorn    a uvicorn server started in a child process on --port.
+  --url      an already running server, e.g. one started with --serve.
+
+Users are seeded with synthetic history, and /exchange_token links new users
+against an in-process FakePlaidClient; for --url targets, start the server
+with --serve so it has the same data and fake Plaid client.
+
+Run from the backend directory:
+    python -m benchmarks.load_test --concurrency 1 10 50 --duration 10
+    python -m benchmarks.load_test --target uvicorn --mix summary=5 transactions=3 exchange_token=1
+    python -m benchmarks.load_test --serve --port 8001   # then: --url http://127.0.0.1:8001
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.results import percentile, run_metadata, summarize, write_results
+from synthetic import generate_dataset
+
+ENDPOINTS = ("summary", "summary_lean", "transactions", "transactions_page", "accounts", "exchange_token")
+DEFAULT_MIX = ["summary=6", "summary_lean=2", "transactions=3", "transactions_page=2", "accounts=1"]
+
+
+def parse_mix(items: List[str]) -> Dict[str, float]:
+    """Parse name=weight pairs into endpoint weights"""
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise SystemExit("The endpoint mix needs at least one positive weight")
+    return mix
+
+
+def setup_app(args: argparse.Namespace, directory: str):
+    """Import the app with fresh storage in directory, seeded users and a fake Plaid client; return main"""
+    os.environ.setdefault("PLAID_CLIENT_ID", "load-test")
+    os.environ.setdefault("PLAID_SECRET", "load-test")
+    os.environ["STORAGE_DIR"] = directory
+    import main
+    from benchmarks.suite import make_storage
+    from fake_plaid import FakePlaidClient
+    from institution_cache import InstitutionCache
+    from response_cache import ResponseCache
+
+    logging.getLogger().setLevel(logging.WARNING)
+    storage = make_storage(args.backend, directory)
+    dataset = generate_dataset(args.users, args.accounts, args.years, args.per_month, seed=args.seed)
+    for user_id, data in dataset.items():
+        storage.save_accounts(user_id, data["accounts"])
+        storage.save_transactions(user_id, data["transactions"])
+    # Point the app at this state, whatever .env says
+    main.data_storage = storage
+    main.institution_cache = InstitutionCache(os.path.join(directory, "shared", "institutions"))
+    main.response_cache = ResponseCache()
+    main.plaid_client = FakePlaidClient(num_transactions=args.exchange_transactions, latency=args.plaid_latency)
+    return main
+
+
+def user_ids(args: argparse.Namespace) -> List[str]:
+    # The ids generate_dataset gives its users
+    return [f"bench_user_{user:03d}" for user in range(args.users)]
+
+
+def build_request(endpoint: str, user_id: str, args: argparse.Namespace, rng: random.Random) -> Tuple[str, str, Any]:
+    """(method, url, json body) for one request of the given endpoint"""
+    end = date.today()
+    query = f"start_date={(end - timedelta(days=args.window_days)).isoformat()}&end_date={end.isoformat()}"
+    if endpoint == "summary":
+        return "GET", f"/summary/{user_id}?{query}", None
+    if endpoint == "summary_lean":
+        return "GET", f"/summary/{user_id}?{query}&detail=lean", None
+    if endpoint == "transactions":
+        return "GET", f"/transactions/{user_id}?{query}", None
+    if endpoint == "transactions_page":
+        return "GET", f"/transactions/{user_id}?{query}&limit=100", None
+    if endpoint == "accounts":
+        return "GET", f"/accounts/{user_id}", None
+    # Link a new user each time, so dashboard users' data (and caches) stay as seeded. Only the
+    # link is timed; the history download runs afterwards as a background job
+    return "POST", "/exchange_token", {"public_token": "public-load", "user_id": f"load_link_{rng.getrandbits(48):x}"}
+
+
+async def monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.005) -> None:
+    """Record how late each short sleep wakes up: time the event loop spent unable to run callbacks"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(loop.time() - expected, 0.0))
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, args: argparse.Namespace,
+                    mix: Dict[str, float], measure_lag: bool) -> Dict[str, Any]:
+    """Run `concurrency` workers for --warmup then --duration seconds; return per-endpoint latencies"""
+    users = user_ids(args)
+    endpoints, weights = zip(*mix.items())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    etags: Dict[str, str] = {}
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + args.warmup
+    deadline = measure_from + args.duration
+
+    async def worker(number: int) -> None:
+        rng = random.Random(args.seed * 10000 + concurrency * 100 + number)
+        while loop.time() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            method, url, body = build_request(endpoint, rng.choice(users), args, rng)
+            headers = {"If-None-Match": etags[url]} if args.etags and url in etags else {}
+            started = loop.time()
+            try:
+                response = await client.request(method, url, json=body, headers=headers)
+                failed = response.status_code >= 400
+                if args.etags and "etag" in response.headers:
+                    etags[url] = response.headers["etag"]
+            except httpx.HTTPError:
+                failed = True
+            finished = loop.time()
+            if started >= measure_from and finished <= deadline:
+                latencies[endpoint].append(finished - started)
+                if failed:
+                    errors[endpoint] += 1
+
+    lag: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag, stop)) if measure_lag else None
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    stop.set()
+    if monitor is not None:
+        await monitor
+
+    results = {}
+    total = sum(len(samples) for samples in latencies.values())
+    for endpoint, samples in sorted(latencies.items()):
+        results[endpoint] = summarize(samples, errors=errors[endpoint],
+                                      throughput_rps=round(len(samples) / args.duration, 1))
+    if total:
+        results["all"] = summarize([s for samples in latencies.values() for s in samples],
+                                   errors=sum(errors.values()), throughput_rps=round(total / args.duration, 1))
+    if lag:
+        lag_ms = [s * 1000 for s in lag]
+        results["loop_lag"] = {"unit": "ms", "n": len(lag_ms), "median": round(percentile(lag_ms, 50), 3),
+                               "p95": round(percentile(lag_ms, 95), 3), "p99": round(percentile(lag_ms, 99), 3),
+                               "max": round(max(lag_ms), 3)}
+    return results
+
+
+async def run_levels(args: argparse.Namespace, mix: Dict[str, float]) -> Dict[str, Dict[str, Any]]:
+    server: Optional[subprocess.Popen] = None
+    if args.url:
+        base_url, transport = args.url, None
+    elif args.target == "uvicorn":
+        server = start_server(args)
+        base_url, transport = f"http://127.0.0.1:{args.port}", None
+    else:
+        app = setup_app(args, tempfile.mkdtemp(prefix="load_test_")).app
+        base_url, transport = "http://load-test", httpx.ASGITransport(app=app)
+
+    results = {}
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=args.timeout) as client:
+            if server is not None:
+                await wait_for_server(client, server)
+            for concurrency in args.concurrency:
+                level = await run_level(client, concurrency, args, mix, measure_lag=transport is not None)
+                print_level(concurrency, level)
+                results.update({f"load.c{concurrency}.{name}": stats for name, stats in level.items()})
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    """Start this module with --serve in a child process, passing on the dataset and backend options"""
+    command = [sys.executable, "-m", "benchmarks.load_test", "--serve", "--port", str(args.port),
+               "--backend", args.backend, "--users", str(args.users), "--accounts", str(args.accounts),
+               "--years", str(args.years), "--per-month", str(args.per_month), "--seed", str(args.seed),
+               "--exchange-transactions", str(args.exchange_transactions),
+               "--plaid-latency", str(args.plaid_latency)]
+    return subprocess.Popen(command)
+
+
+async def wait_for_server(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"The load-test server exited with status {server.returncode}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("The load-test server did not start in time")
+
+
+def print_level(concurrency: int, level: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\nconcurrency {concurrency}")
+    print(f"{'endpoint':>18} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in level.items():
+        if name == "loop_lag":
+            continue
+        print(f"{name:>18} {stats['n']:>9} {stats['errors']:>7} {stats['throughput_rps']:>8.1f} {stats['median']:>9.2f} "
+              f"{stats['p95']:>9.2f} {stats['p99']:>9.2f} {stats['max']:>9.2f}")
+    if "loop_lag" in level:
+        lag = level["loop_lag"]
+        print(f"{'event-loop lag':>18} {'':>9} {'':>7} {'':>8} {lag['median']:>9.2f} {lag['p95']:>9.2f} "
+              f"{lag['p99']:>9.2f} {lag['max']:>9.2f}")
+
+
+def serve(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    main = setup_app(args, tempfile.mkdtemp(prefix="load_test_server_"))
+    print(f"Serving {args.users} seeded users ({args.backend} storage) on http://127.0.0.1:{args.port}")
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--url", default=None, help="load an already running server instead")
+    parser.add_argument("--serve", action="store_true", help="only start a seeded server with a fake Plaid client")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=1, help="unmeasured seconds before each level")
+    parser.add_argument("--mix", nargs="+", default=DEFAULT_MIX, help=f"endpoint=weight for {', '.join(ENDPOINTS)}")
+    parser.add_argument("--window-days", type=int, default=365, help="date range requested from /summary and /transactions")
+    parser.add_argument("--etags", action="store_true", help="send If-None-Match with the last ETag seen per URL")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--accounts", type=int, default=4, help="accounts per user")
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--per-month", type=int, default=30, help="transactions per account per month")
+    parser.add_argument("--exchange-transactions", type=int, default=500, help="history served to each linked user")
+    parser.add_argument("--plaid-latency", type=float, default=0.05, help="simulated seconds per Plaid call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.serve:
+        serve(args)
+        return
+
+    mix = parse_mix(args.mix)
+    print(f"{args.users} users x {args.accounts} accounts x {args.years:g} years, mix "
+          + ", ".join(f"{name}={weight:g}" for name, weight in mix.items()))
+    results = asyncio.run(run_levels(args, mix))
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    write_results(output, run_metadata(args), results)
+    print(f"\nWrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Summarize benchmark timings, write them as JSON, and compare two result files.
+
+Compare a run against a baseline (exits 1 if any median slowed down by more
+than the tolerance). Run from the backend directory:
+    python -m benchmarks.results baseline.json new.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """The q-th percentile (0-100) of samples, interpolating linearly between ranks"""
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(seconds: Sequence[float], **extra: Any) -> Dict[str, Any]:
+    """Summary statistics of timings in seconds, reported in milliseconds"""
+    ms = [s * 1000 for s in seconds]
+    return {
+        "unit": "ms",
+        "n": len(ms),
+        "min": round(min(ms), 3),
+        "median": round(percentile(ms, 50), 3),
+        "p95": round(percentile(ms, 95), 3),
+        "p99": round(percentile(ms, 99), 3),
+        "max": round(max(ms), 3),
+        "mean": round(sum(ms) / len(ms), 3),
+        **extra,
+    }
+
+
+def run_metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    """What produced a result file: arguments, code revision and machine"""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def write_results(path: str, meta: Dict[str, Any], results: Dict[str, Dict[str, Any]]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.25,
+            stat: str = "median") -> List[str]:
+    """Print how each shared benchmark moved; return the names that regressed beyond tolerance"""
+    regressions = []
+    old_results, new_results = baseline["results"], current["results"]
+    print(f"{'benchmark':<48} {'before':>10} {'after':>10} {'change':>8}")
+    for name in sorted(set(old_results) & set(new_results)):
+        before, after = old_results[name].get(stat), new_results[name].get(stat)
+        if not before or after is None:
+            continue
+        change = after / before - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<48} {before:>10.3f} {after:>10.3f} {change:>+8.1%}{flag}")
+    only_before, only_after = len(set(old_results) - set(new_results)), len(set(new_results) - set(old_results))
+    if only_before or only_after:
+        print(f"({only_before} benchmarks only in the baseline, {only_after} only in this run)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, as a fraction")
+    parser.add_argument("--stat", default="median", choices=["min", "median", "p95", "p99", "mean"])
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.tolerance, args.stat)
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks slowed down by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
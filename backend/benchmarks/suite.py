@@ -0,0 +1,241 @@
+"""Benchmark DataStorage and the API on N users x M accounts x Y years of synthetic transactions.
+
+For each storage backend this times save_accounts, save_transactions (first
+save and an unchanged re-save), get_transactions over several windows (cold,
+on a fresh DataStorage, and warm), get_account_summary and clean_test_data.
+It then drives /exchange_token (and the ingest job it starts), /summary,
+/transactions, /search and /analytics end to end through the ASGI app, with
+a FakePlaidClient serving each user's history.
+
+Results are written as JSON; pass --baseline to compare against an earlier
+run (see benchmarks.results). Run from the backend directory:
+    python -m benchmarks.suite --users 3 --accounts 4 --years 5 --output before.json
+    python -m benchmarks.suite --users 3 --accounts 4 --years 5 --baseline before.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from data_storage import DataStorage
+from benchmarks.results import compare, run_metadata, summarize, write_results
+from synthetic import generate_dataset
+
+Results = Dict[str, Dict[str, Any]]
+
+
+def make_storage(backend: str, directory: str) -> DataStorage:
+    """A storage backend in directory; JSON compaction runs inline so it is timed with the save that triggers it"""
+    if backend == "sqlite":
+        from sqlite_storage import SQLiteDataStorage
+        return SQLiteDataStorage(directory)
+    return DataStorage(directory, background_compaction=False)
+
+
+def timed(func: Callable, *args, **kwargs) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def windows(args: argparse.Namespace) -> List[Tuple[str, date, date]]:
+    """(name, start, end) for each --windows size plus the whole history"""
+    end = date.today()
+    sizes = [(f"{days}d", days) for days in args.windows] + [("all", int(365 * args.years))]
+    return [(name, end - timedelta(days=days), end) for name, days in sizes]
+
+
+def bench_storage(backend: str, dataset: Dict[str, Dict[str, list]], args: argparse.Namespace) -> Results:
+    directory = tempfile.mkdtemp(prefix=f"bench_suite_{backend}_")
+    storage = make_storage(backend, directory)
+    samples: Dict[str, List[float]] = defaultdict(list)
+    rows: Dict[str, List[int]] = defaultdict(list)
+
+    for user_id, data in dataset.items():
+        samples["save_accounts"].append(timed(storage.save_accounts, user_id, data["accounts"])[0])
+        samples["save_transactions"].append(timed(storage.save_transactions, user_id, data["transactions"])[0])
+    # A refresh that re-sends rows that are already stored
+    for user_id, data in dataset.items():
+        samples["save_transactions.unchanged"].append(
+            timed(storage.save_transactions, user_id, data["transactions"])[0]
+        )
+
+    ranges = windows(args)
+    for user_id in dataset:
+        # A fresh instance has nothing cached, so this includes parsing the user's files
+        elapsed, result = timed(make_storage(backend, directory).get_transactions, user_id, *ranges[0][1:])
+        samples[f"get_transactions.{ranges[0][0]}.cold"].append(elapsed)
+        for name, start, end in ranges:
+            for _ in range(args.repeat):
+                elapsed, result = timed(storage.get_transactions, user_id, start, end)
+                samples[f"get_transactions.{name}"].append(elapsed)
+                rows[f"get_transactions.{name}"].append(len(result))
+        for detail in ("full", "lean"):
+            for name, start, end in (ranges[0], ranges[-1]):
+                for _ in range(args.repeat):
+                    samples[f"get_account_summary.{detail}.{name}"].append(
+                        timed(storage.get_account_summary, user_id, start, end, detail=detail)[0]
+                    )
+
+    for user_id in dataset:
+        samples["clean_test_data"].append(timed(storage.clean_test_data, user_id)[0])
+
+    results = {}
+    for name, seconds in samples.items():
+        extra = {"rows": round(sum(rows[name]) / len(rows[name]))} if rows.get(name) else {}
+        results[f"storage.{backend}.{name}"] = summarize(seconds, **extra)
+    return results
+
+
+def bench_api(backend: str, dataset: Dict[str, Dict[str, list]], args: argparse.Namespace) -> Results:
+    directory = tempfile.mkdtemp(prefix=f"bench_suite_api_{backend}_")
+    os.environ.setdefault("PLAID_CLIENT_ID", "bench")
+    os.environ.setdefault("PLAID_SECRET", "bench")
+    os.environ["STORAGE_DIR"] = directory
+    import main
+    from fastapi.testclient import TestClient
+    from analytics import FrameCache
+    from fake_plaid import FakePlaidClient
+    from forecasting import Forecaster
+    from institution_cache import InstitutionCache
+    from jobs import JobRunner
+    from response_cache import ResponseCache
+
+    # main logs at INFO; keep that out of the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    # Point the app at fresh state for this backend, whatever .env says
+    main.data_storage = make_storage(backend, directory)
+    main.institution_cache = InstitutionCache(os.path.join(directory, "shared", "institutions"))
+    main.response_cache = ResponseCache()
+    main.analytics_frames = FrameCache()
+    main.forecaster = Forecaster(os.path.join(directory, "forecasts"))
+    main.jobs = JobRunner(os.path.join(directory, "jobs"))
+    # The app's shutdown hooks stop its executors when the client below exits
+    main.plaid_executor = ThreadPoolExecutor(max_workers=main.plaid_executor._max_workers)
+    main.storage_executor = ThreadPoolExecutor(max_workers=main.storage_executor._max_workers)
+    # Entered, so background jobs keep running on one event loop between requests
+    with TestClient(main.app) as client:
+        samples: Dict[str, List[float]] = defaultdict(list)
+
+        def get(name: str, url: str, headers: Dict[str, str] = None, expect: int = 200):
+            elapsed, response = timed(client.get, url, headers=headers)
+            if response.status_code != expect:
+                raise RuntimeError(f"GET {url} returned {response.status_code}: {response.text[:200]}")
+            samples[name].append(elapsed)
+            return response
+
+        start_date = (date.today() - timedelta(days=int(365 * args.years))).isoformat()
+        for user_number, (user_id, data) in enumerate(dataset.items()):
+            # Same seed and sizes as generate_dataset, so the fake item serves this user's history
+            main.plaid_client = FakePlaidClient(
+                num_transactions=len(data["transactions"]), num_accounts=len(data["accounts"]),
+                years=args.years, seed=args.seed * 1000 + user_number,
+            )
+            started = time.perf_counter()
+            elapsed, response = timed(client.post, "/exchange_token", json={
+                "public_token": "public-bench", "user_id": user_id,
+                "start_date": start_date, "end_date": date.today().isoformat(),
+            })
+            if response.status_code != 200:
+                raise RuntimeError(f"/exchange_token returned {response.status_code}: {response.text[:200]}")
+            samples["exchange_token"].append(elapsed)
+            # The history is downloaded by a background job; time it until it is saved
+            while True:
+                job = client.get(response.json()["status_url"]).json()
+                if job["status"] not in ("queued", "running"):
+                    break
+                time.sleep(0.01)
+            if job["status"] != "succeeded":
+                raise RuntimeError(f"Ingest job for {user_id} {job['status']}: {job['error']}")
+            samples["ingest_job"].append(time.perf_counter() - started)
+
+        # Let the forecasts the saves scheduled finish, so training does not overlap the timings
+        while any(main.forecaster.is_training(user_id) for user_id in dataset):
+            time.sleep(0.05)
+
+        ranges = windows(args)
+        for user_id in dataset:
+            for name, start, end in (ranges[0], ranges[-1]):
+                query = f"start_date={start.isoformat()}&end_date={end.isoformat()}"
+                endpoints = [(f"summary.{detail}.{name}", f"/summary/{user_id}?{query}&detail={detail}")
+                             for detail in ("full", "lean")]
+                endpoints += [(f"transactions.{name}", f"/transactions/{user_id}?{query}"),
+                              (f"transactions.{name}.page", f"/transactions/{user_id}?{query}&limit=100"),
+                              (f"analytics.series.{name}", f"/analytics/{user_id}/series?{query}&by=merchant"),
+                              (f"analytics.merchants.{name}", f"/analytics/{user_id}/merchants?{query}"),
+                              (f"search.{name}", f"/search/{user_id}?q=star&{query}")]
+                for key, url in endpoints:
+                    for _ in range(args.repeat):
+                        # An empty response cache forces the body to be computed and serialized
+                        main.response_cache = ResponseCache()
+                        response = get(f"{key}.uncached", url)
+                    for _ in range(args.repeat):
+                        get(f"{key}.cached", url)
+                    for _ in range(args.repeat):
+                        get(f"{key}.not_modified", url, {"If-None-Match": response.headers["etag"]}, expect=304)
+                for _ in range(args.repeat):
+                    get(f"transactions.{name}.ndjson", f"/transactions/{user_id}?{query}",
+                        {"Accept": "application/x-ndjson"})
+            get("accounts", f"/accounts/{user_id}")
+
+    return {f"api.{backend}.{name}": summarize(seconds) for name, seconds in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--accounts", type=int, default=4, help="accounts per user")
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--per-month", type=int, default=30, help="transactions per account per month")
+    parser.add_argument("--windows", type=int, nargs="+", default=[30, 90, 365], help="get_transactions windows in days")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=["json", "sqlite"], choices=["json", "sqlite"])
+    parser.add_argument("--skip-api", action="store_true", help="only benchmark DataStorage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/suite-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed median slowdown vs the baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    dataset = generate_dataset(args.users, args.accounts, args.years, args.per_month, seed=args.seed)
+    rows = sum(len(data["transactions"]) for data in dataset.values())
+    print(f"{args.users} users x {args.accounts} accounts x {args.years:g} years: {rows} transactions")
+
+    results: Results = {}
+    for backend in args.backends:
+        results.update(bench_storage(backend, dataset, args))
+        if not args.skip_api:
+            results.update(bench_api(backend, dataset, args))
+
+    print(f"{'benchmark':<56} {'n':>4} {'median':>9} {'p95':>9} {'max':>9}  (ms)")
+    for name, stats in results.items():
+        print(f"{name:<56} {stats['n']:>4} {stats['median']:>9.2f} {stats['p95']:>9.2f} {stats['max']:>9.2f}")
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"suite-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    meta = {**run_metadata(args), "transactions": rows}
+    write_results(output, meta, results)
+    print(f"\nWrote {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, {"meta": meta, "results": results}, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmarks slowed down by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""pytest setup: the backend modules are flat, so tests import them from this directory"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# A manual script that calls the Plaid sandbox, not a test
+collect_ignore = ["test_plaid.py"]
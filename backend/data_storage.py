@@ -1,59 +1,859 @@
+import calendar
+import gzip
+import heapq
 import json
 import os
+import queue
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
 import logging
 
+from metrics import STORAGE_BYTES, STORAGE_OPERATION_SECONDS
+from profiling import span
+from search_index import SearchIndex
+from transaction_table import TransactionSlice, TransactionTable, newest_first
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only serialize threads within one process
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+class UserLock:
+    """Reentrant lock serializing one user's storage access across threads and processes.
+
+    Threads are serialized by an RLock; where fcntl is available the outermost
+    acquisition also takes an exclusive flock on the user's lock file, so
+    several server workers sharing a storage directory do not interleave.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "UserLock":
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        self._lock.release()
+
+class TransactionIndex:
+    """Transactions sorted by (date, transaction_id) with their dates pre-parsed to ordinals.
+
+    Date range lookups bisect the ordinals instead of parsing every row, so a
+    query costs O(log n + k). Results are returned newest first, matching the
+    order Plaid returns transactions in.
+    """
+
+    def __init__(self, transactions: List[Dict[str, Any]]):
+        keyed = []
+        self.undated: List[Dict[str, Any]] = []
+        for transaction in transactions:
+            try:
+                ordinal = date.fromisoformat(transaction['date']).toordinal()
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Error parsing transaction date: {str(e)}")
+                self.undated.append(transaction)
+                continue
+            keyed.append((ordinal, transaction.get("transaction_id") or "", transaction))
+        keyed.sort(key=lambda item: (item[0], item[1]))
+        self.ordinals: List[int] = [item[0] for item in keyed]
+        self.transactions: List[Dict[str, Any]] = [item[2] for item in keyed]
+        self._by_id: Optional[Dict[Any, Dict[str, Any]]] = None
+        self._rollups: Optional[TransactionRollups] = None
+        self._table: Optional[TransactionTable] = None
+        self._search: Optional[SearchIndex] = None
+
+    @property
+    def by_id(self) -> Dict[Any, Dict[str, Any]]:
+        """Map of transaction_id to transaction, built on first use"""
+        if self._by_id is None:
+            self._by_id = {t.get("transaction_id"): t for t in self.transactions}
+            self._by_id.update((t.get("transaction_id"), t) for t in self.undated)
+        return self._by_id
+
+    @property
+    def rollups(self) -> "TransactionRollups":
+        """Daily and monthly totals over the indexed transactions, built on first use"""
+        if self._rollups is None:
+            self._rollups = TransactionRollups.build(self)
+        return self._rollups
+
+    @property
+    def table(self) -> Optional[TransactionTable]:
+        """Columnar copy of the dated rows, built on first use; None if NumPy is not installed"""
+        if self._table is None and TransactionTable.available():
+            self._table = TransactionTable(self.transactions, self.ordinals)
+        return self._table
+
+    @property
+    def search(self) -> SearchIndex:
+        """Inverted index over the transactions' names, merchants and categories, built on first use"""
+        if self._search is None:
+            self._search = SearchIndex.build(self.transactions + self.undated)
+        return self._search
+
+    def updated(self, upserts: List[Dict[str, Any]], removed: List[Any]) -> "TransactionIndex":
+        """Return a new index with upserts applied and removed ids dropped.
+
+        Small deltas are spliced into copies of the sorted lists, and into any
+        rollups, columnar table and search index already built, so only the
+        changed rows are parsed; large ones fall back to a full rebuild.
+        """
+        if len(upserts) + len(removed) > max(64, len(self) // 8):
+            by_id = dict(self.by_id)
+            for transaction_id in removed:
+                by_id.pop(transaction_id, None)
+            by_id.update((t.get("transaction_id"), t) for t in upserts)
+            return TransactionIndex(list(by_id.values()))
+
+        index = TransactionIndex([])
+        index.ordinals = list(self.ordinals)
+        index.transactions = list(self.transactions)
+        index.undated = list(self.undated)
+        by_id = dict(self.by_id)
+        replaced = []
+        for transaction_id in [*removed, *(t.get("transaction_id") for t in upserts)]:
+            old = by_id.pop(transaction_id, None)
+            if old is not None:
+                index._remove(old)
+                replaced.append(old)
+        for transaction in upserts:
+            by_id[transaction.get("transaction_id")] = transaction
+            index._insert(transaction)
+        index._by_id = by_id
+        if self._rollups is not None:
+            index._rollups = self._rollups.updated(replaced, upserts)
+        if self._search is not None:
+            index._search = self._search.updated(replaced, upserts)
+        if self._table is not None:
+            removed_at = [i for i in map(self._find, replaced) if i is not None]
+            inserted = [(i, index.ordinals[i], t) for t, i in zip(upserts, map(index._find, upserts)) if i is not None]
+            index._table = self._table.updated(removed_at, inserted)
+        return index
+
+    def _find(self, transaction: Dict[str, Any]) -> Optional[int]:
+        """Position of this row object in self.transactions, or None if it is undated (or not indexed)"""
+        try:
+            ordinal = date.fromisoformat(transaction['date']).toordinal()
+        except (ValueError, KeyError, TypeError):
+            return None
+        lo = bisect_left(self.ordinals, ordinal)
+        hi = bisect_right(self.ordinals, ordinal, lo)
+        for i in range(lo, hi):
+            if self.transactions[i] is transaction:
+                return i
+        return None
+
+    def _remove(self, transaction: Dict[str, Any]) -> None:
+        i = self._find(transaction)
+        if i is not None:
+            del self.ordinals[i]
+            del self.transactions[i]
+        else:
+            self.undated = [t for t in self.undated if t is not transaction]
+
+    def _insert(self, transaction: Dict[str, Any]) -> None:
+        try:
+            ordinal = date.fromisoformat(transaction['date']).toordinal()
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Error parsing transaction date: {str(e)}")
+            self.undated.append(transaction)
+            return
+        i = self.position(ordinal, transaction.get("transaction_id") or "")
+        self.ordinals.insert(i, ordinal)
+        self.transactions.insert(i, transaction)
+
+    def __len__(self) -> int:
+        return len(self.transactions) + len(self.undated)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Return every transaction, newest first, followed by any without a valid date"""
+        return self.transactions[::-1] + self.undated
+
+    def range(self, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        """Return transactions dated within [start_date, end_date], newest first"""
+        lo, hi = self.bounds(start_date, end_date)
+        return self.transactions[lo:hi][::-1]
+
+    def bounds(self, start_date: date, end_date: date) -> Tuple[int, int]:
+        """Return the slice of self.transactions covering [start_date, end_date]"""
+        lo = bisect_left(self.ordinals, start_date.toordinal())
+        hi = bisect_right(self.ordinals, end_date.toordinal(), lo)
+        return lo, hi
+
+    def position(self, ordinal: int, transaction_id: str) -> int:
+        """Return the index of the first row whose (date, transaction_id) is >= the given key"""
+        lo = bisect_left(self.ordinals, ordinal)
+        hi = bisect_right(self.ordinals, ordinal, lo)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.transactions[mid].get("transaction_id") or "") < transaction_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_range(self, start_date: date, end_date: date,
+                   after: Optional[Tuple[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield transactions in [start_date, end_date] newest first.
+
+        If after is a (date, transaction_id) key, only rows that sort strictly
+        after it in that order are yielded, which makes it usable as a cursor.
+        """
+        lo, hi = self.bounds(start_date, end_date)
+        if after is not None:
+            hi = min(hi, self.position(date.fromisoformat(after[0]).toordinal(), after[1]))
+        for i in range(hi - 1, lo - 1, -1):
+            yield self.transactions[i]
+
+def _month_index(day: date) -> int:
+    return day.year * 12 + day.month - 1
+
+def _month_bounds(month: int) -> Tuple[int, int]:
+    """Return the first and last day ordinals of a month index"""
+    year, month = divmod(month, 12)
+    return (date(year, month + 1, 1).toordinal(),
+            date(year, month + 1, calendar.monthrange(year, month + 1)[1]).toordinal())
+
+class TransactionRollups:
+    """Per-day and per-month transaction totals by category and by account_id.
+
+    Buckets map (dimension, key) to (amount in integer cents, count), so
+    incremental updates never accumulate float error. A date range is
+    answered from the whole months it covers plus the days at either edge,
+    i.e. from at most ~62 daily and one monthly bucket per month, however
+    many transactions are stored. Institution and account type totals are
+    derived from the account_id totals by build_account_summary.
+
+    Instances are shared through the cache and never mutated after being
+    built; updated() returns a copy that shares unchanged buckets.
+    """
+
+    DIMENSIONS = ("category", "account_id")
+
+    def __init__(self):
+        self.daily: Dict[int, Dict[Tuple[str, Any], Tuple[int, int]]] = {}
+        self.monthly: Dict[int, Dict[Tuple[str, Any], Tuple[int, int]]] = {}
+        # Transactions without a valid date, in a single bucket under the key None
+        self.undated: Dict[None, Dict[Tuple[str, Any], Tuple[int, int]]] = {}
+
+    @classmethod
+    def build(cls, index: TransactionIndex) -> "TransactionRollups":
+        rollups = cls()
+        written = set()
+        for ordinal, transaction in zip(index.ordinals, index.transactions):
+            rollups._apply(ordinal, transaction, 1, written)
+        for transaction in index.undated:
+            rollups._apply(None, transaction, 1, written)
+        return rollups
+
+    def updated(self, removed: List[Dict[str, Any]], added: List[Dict[str, Any]]) -> "TransactionRollups":
+        """Return new rollups with the removed rows subtracted and the added rows counted"""
+        rollups = TransactionRollups()
+        rollups.daily = dict(self.daily)
+        rollups.monthly = dict(self.monthly)
+        rollups.undated = dict(self.undated)
+        written = set()
+        for rows, sign in ((removed, -1), (added, 1)):
+            for transaction in rows:
+                try:
+                    ordinal = date.fromisoformat(transaction['date']).toordinal()
+                except (ValueError, KeyError, TypeError):
+                    ordinal = None
+                rollups._apply(ordinal, transaction, sign, written)
+        return rollups
+
+    def _apply(self, ordinal: Optional[int], transaction: Dict[str, Any], sign: int, written: set) -> None:
+        cents = round(float(transaction.get("amount", 0)) * 100) * sign
+        keys = (("category", (transaction.get("category") or ["Uncategorized"])[0]),
+                ("account_id", transaction.get("account_id")))
+        if ordinal is None:
+            targets = ((self.undated, None),)
+        else:
+            targets = ((self.daily, ordinal), (self.monthly, _month_index(date.fromordinal(ordinal))))
+        for table, bucket_key in targets:
+            # Copy a shared bucket before its first write
+            if (id(table), bucket_key) not in written:
+                table[bucket_key] = dict(table.get(bucket_key, {}))
+                written.add((id(table), bucket_key))
+            bucket = table[bucket_key]
+            for key in keys:
+                total, count = bucket.get(key, (0, 0))
+                if count + sign:
+                    bucket[key] = (total + cents, count + sign)
+                else:
+                    bucket.pop(key, None)
+            if not bucket:
+                del table[bucket_key]
+                written.discard((id(table), bucket_key))
+
+    def _buckets(self, start_date: date, end_date: date) -> List[Dict[Tuple[str, Any], Tuple[int, int]]]:
+        """Return the buckets that exactly cover [start_date, end_date]"""
+        lo, hi = start_date.toordinal(), end_date.toordinal()
+        first_month = _month_index(start_date) + (start_date.day != 1)
+        last_month = _month_index(end_date) - (hi != _month_bounds(_month_index(end_date))[1])
+        if first_month > last_month:
+            days = range(lo, hi + 1)
+            months = range(0)
+        else:
+            days = [*range(lo, _month_bounds(first_month)[0]), *range(_month_bounds(last_month)[1] + 1, hi + 1)]
+            months = range(first_month, last_month + 1)
+            if len(months) > len(self.monthly):
+                months = [month for month in self.monthly if first_month <= month <= last_month]
+        if len(days) > len(self.daily):
+            days = [day for day in self.daily if lo <= day <= hi]
+        return ([self.monthly[month] for month in months if month in self.monthly]
+                + [self.daily[day] for day in days if day in self.daily])
+
+    def totals(self, start_date: date = None, end_date: date = None) -> Dict[str, Dict[Any, Dict[str, Any]]]:
+        """Return {dimension: {key: {"total_amount", "count"}}} for transactions in the date range.
+
+        Without a full range every transaction counts, including undated ones,
+        matching get_transactions.
+        """
+        if not start_date or not end_date:
+            buckets = [*self.monthly.values(), *self.undated.values()]
+        else:
+            buckets = self._buckets(start_date, end_date)
+        sums: Dict[Tuple[str, Any], Tuple[int, int]] = {}
+        for bucket in buckets:
+            for key, (total, count) in bucket.items():
+                current = sums.get(key)
+                sums[key] = (total, count) if current is None else (current[0] + total, current[1] + count)
+        result = {dimension: {} for dimension in self.DIMENSIONS}
+        for (dimension, key), (total, count) in sums.items():
+            result[dimension][key] = {"total_amount": total / 100, "count": count}
+        return result
+
+SNAPSHOT_FORMAT = "banksflow-transactions"
+SNAPSHOT_VERSION = 1
+
+def iter_snapshot(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the transactions stored in a snapshot file, one decoded line at a time.
+
+    Snapshots are newline-delimited JSON: a header line naming the format and
+    version, then one compact transaction per line, newest first with undated
+    rows last. Gzip-compressed files are detected by their magic number.
+    """
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    with (gzip.open(path, 'rt', encoding='utf-8') if compressed else open(path, 'r', encoding='utf-8')) as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get("format") != SNAPSHOT_FORMAT or header.get("version", 0) > SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot format in {path}: {header.get('format')} v{header.get('version')}")
+        # Decode a batch of lines per call: one call is cheaper than many, and
+        # the decoder shares key strings between the rows of a document
+        while True:
+            lines = list(islice(f, 1000))
+            if not lines:
+                break
+            batch = [line for line in lines if line.strip()]
+            if batch:
+                yield from json.loads("[" + ",".join(batch) + "]")
+
+SUMMARY_DETAIL_LEVELS = ("full", "lean")
+
+def _route_slice(transactions: TransactionSlice, account_buckets: Dict[Any, List[Dict[str, Any]]],
+                 categories: Dict[str, Dict[str, Any]], new_bucket: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 lean: bool, include_ids: bool, top: int, sum_accounts: bool, sum_categories: bool) -> float:
+    """Columnar version of build_account_summary's routing pass; returns the slice's total amount.
+
+    Rows are grouped by account and by category with vectorized sorts, and
+    only the rows a bucket embeds are gathered, in the same newest-first
+    order the row-by-row pass produces.
+    """
+    def fill(bucket: Dict[str, Any], positions, key: str) -> None:
+        if not lean:
+            bucket[key].extend(transactions.rows_at(positions))
+            return
+        if include_ids:
+            bucket["transaction_ids"].extend(transactions.ids_at(positions))
+        if top:
+            bucket["top_transactions"].extend(transactions.rows_at(positions[:top]))
+
+    owned: Dict[int, Tuple[Dict[str, Any], list]] = {}
+    for account_id, positions in transactions.positions("account_id").items():
+        for bucket in account_buckets.get(account_id, ()):
+            owned.setdefault(id(bucket), (bucket, []))[1].append(positions)
+    for bucket, groups in owned.values():
+        positions = newest_first(groups)
+        fill(bucket, positions, "recent_transactions")
+        if lean and sum_accounts:
+            bucket["transaction_count"] += len(positions)
+            bucket["transaction_total"] += transactions.amount_at(positions)
+
+    # Create category buckets in the order the row-by-row pass meets them: newest row first
+    by_category = sorted(transactions.positions("category").items(), key=lambda item: -item[1][-1])
+    for category, positions in by_category:
+        if category not in categories:
+            categories[category] = new_bucket({"total_amount": 0.0, "count": 0})
+        fill(categories[category], positions[::-1], "transactions")
+        if sum_categories:
+            categories[category]["total_amount"] += transactions.amount_at(positions)
+            categories[category]["count"] += len(positions)
+    return transactions.amount_at(slice(transactions.lo, transactions.hi)) if sum_categories else 0
+
+def build_account_summary(accounts: List[Dict[str, Any]], transactions: List[Dict[str, Any]],
+                          category_totals: Optional[Dict[str, Dict[str, Any]]] = None,
+                          account_totals: Optional[Dict[str, Dict[str, Any]]] = None,
+                          detail: str = "full", include_ids: bool = False, top: int = 0) -> Dict[str, Any]:
+    """Group accounts and transactions by institution, account type and category.
+
+    Accounts are bucketed first and indexed by account_id, then every
+    transaction is routed to its institution, account type and category
+    buckets in a single pass, so the cost is O(accounts + transactions).
+    transactions may also be a TransactionSlice, which is routed with
+    vectorized group-bys instead (see _route_slice).
+    If category_totals or account_totals are given (e.g. computed by the
+    database), totals and counts are taken from them instead of being summed
+    here.
+
+    With detail="full" each bucket embeds its transactions. With
+    detail="lean" buckets only carry transaction_count/transaction_total
+    (institutions and account types) or total_amount/count (categories),
+    plus transaction_ids if include_ids is set and the first `top`
+    transactions (the most recent, as transactions are newest first) under
+    top_transactions.
+    """
+    if detail not in SUMMARY_DETAIL_LEVELS:
+        raise ValueError(f"Unknown summary detail level: {detail}")
+    lean = detail == "lean"
+
+    def new_bucket(totals: Dict[str, Any]) -> Dict[str, Any]:
+        if not lean:
+            return {**totals, "recent_transactions" if "total_balance" in totals else "transactions": []}
+        bucket = dict(totals)
+        if include_ids:
+            bucket["transaction_ids"] = []
+        if top:
+            bucket["top_transactions"] = []
+        return bucket
+
+    account_bucket_totals = {"total_balance": 0.0}
+    if lean:
+        account_bucket_totals.update({"transaction_count": 0, "transaction_total": 0.0})
+
+    # 1. Group accounts by financial institution and by type
+    institutions = {}
+    account_types = {}
+    account_buckets = {}
+    for acc in accounts:
+        institution_name = acc.get("institution_name", "Unknown Institution")
+        acc_type = acc.get("type", "unknown")
+        balance = float(acc.get("balances", {}).get("current", 0))
+        buckets = account_buckets.setdefault(acc.get("account_id"), [])
+        for groups, key in ((institutions, institution_name), (account_types, acc_type)):
+            if key not in groups:
+                groups[key] = {"accounts": [], **new_bucket(account_bucket_totals)}
+            groups[key]["accounts"].append(acc)
+            groups[key]["total_balance"] += balance
+            # An account_id listed twice may belong to more than one bucket
+            if all(bucket is not groups[key] for bucket in buckets):
+                buckets.append(groups[key])
+
+    # 2. Route each transaction to its institution, account type and category
+    categories = {}
+    total_recent_transactions = 0
+    if isinstance(transactions, TransactionSlice):
+        total_recent_transactions = _route_slice(
+            transactions, account_buckets, categories, new_bucket, lean, include_ids, top,
+            sum_accounts=account_totals is None, sum_categories=category_totals is None,
+        )
+        transactions = ()
+    for transaction in transactions:
+        amount = float(transaction.get("amount", 0))
+        category = (transaction.get("category") or ["Uncategorized"])[0]
+        if category not in categories:
+            categories[category] = new_bucket({"total_amount": 0.0, "count": 0})
+        category_bucket = categories[category]
+
+        if not lean:
+            for bucket in account_buckets.get(transaction.get("account_id"), ()):
+                bucket["recent_transactions"].append(transaction)
+            category_bucket["transactions"].append(transaction)
+        else:
+            owners = account_buckets.get(transaction.get("account_id"), ())
+            if account_totals is None:
+                for bucket in owners:
+                    bucket["transaction_count"] += 1
+                    bucket["transaction_total"] += amount
+            for bucket in (*owners, category_bucket):
+                if include_ids:
+                    bucket["transaction_ids"].append(transaction.get("transaction_id"))
+                if top and len(bucket["top_transactions"]) < top:
+                    bucket["top_transactions"].append(transaction)
+
+        if category_totals is None:
+            total_recent_transactions += amount
+            category_bucket["total_amount"] += amount
+            category_bucket["count"] += 1
+
+    if category_totals is not None:
+        for category, totals in category_totals.items():
+            if category not in categories:
+                categories[category] = new_bucket({"total_amount": 0.0, "count": 0})
+            categories[category].update(totals)
+        total_recent_transactions = sum(totals["total_amount"] for totals in category_totals.values())
+
+    if lean and account_totals is not None:
+        for account_id, totals in account_totals.items():
+            for bucket in account_buckets.get(account_id, ()):
+                bucket["transaction_count"] += totals["count"]
+                bucket["transaction_total"] += totals["total_amount"]
+
+    # Log institution information for debugging (runs on every summary, so only at DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Institution Summary:")
+        for inst_name, inst_data in institutions.items():
+            logger.debug(f"Institution: {inst_name}")
+            logger.debug(f"Number of accounts: {len(inst_data['accounts'])}")
+            logger.debug(f"Total balance: ${inst_data['total_balance']:.2f}")
+            if lean:
+                logger.debug(f"Recent transactions: {inst_data['transaction_count']}")
+            else:
+                logger.debug(f"Recent transactions: {len(inst_data['recent_transactions'])}")
+            logger.debug("---")
+
+    # Calculate overall totals
+    total_balance = sum(float(acc.get("balances", {}).get("current", 0)) for acc in accounts)
+
+    return {
+        "total_balance": total_balance,
+        "total_recent_transactions": total_recent_transactions,
+        "institutions": institutions,
+        "account_types": account_types,
+        "categories": categories,
+        "last_updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        **({"detail": detail} if lean else {})
+    }
+
 class DataStorage:
-    def __init__(self, storage_dir: str = "data"):
+    # The `backend` label on storage metrics
+    backend_name = "json"
+
+    def __init__(self, storage_dir: str = "data", cache_max_entries: int = 128,
+                 cache_max_bytes: int = 256 * 1024 * 1024,
+                 compact_threshold_bytes: int = 1024 * 1024, background_compaction: bool = True,
+                 write_behind_delay: Optional[float] = None, compress_snapshots: bool = False):
         self.storage_dir = storage_dir
+        self.lock_dir = os.path.join(storage_dir, "locks")
+        self.version_dir = os.path.join(storage_dir, "versions")
         self._ensure_storage_dir()
 
+        # Transactions are stored as a snapshot plus an append-only log of
+        # upserts and deletes. Once the log passes compact_threshold_bytes it
+        # is folded into a new snapshot, on a background thread if enabled.
+        # Snapshots are NDJSON (see iter_snapshot), gzipped if compress_snapshots.
+        self.compress_snapshots = compress_snapshots
+        self.compact_threshold_bytes = compact_threshold_bytes
+        self.background_compaction = background_compaction
+        self._user_locks: Dict[str, UserLock] = {}
+        self._user_locks_lock = threading.Lock()
+        self._compaction_queue: "queue.Queue[str]" = queue.Queue()
+        self._compaction_pending = set()
+        self._compactor: Optional[threading.Thread] = None
+
+        # Optional write-behind: with write_behind_delay set, save_accounts and
+        # save_transactions queue their rows and a timer writes each user's
+        # queue once, write_behind_delay seconds after the first queued save,
+        # so a burst of saves costs a single flush. Reads flush the user's
+        # queue first, so callers in this process always see their writes.
+        self.write_behind_delay = write_behind_delay
+        self._pending_writes: Dict[str, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+
+        # In-memory cache of parsed user files, keyed by (user_id, data_type).
+        # Each entry remembers its files' (mtime, size) so edits made by other
+        # processes are picked up, and entries are evicted least recently used
+        # once either budget is exceeded. Sizes are approximated by file size.
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[tuple, int, Any]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     def _ensure_storage_dir(self):
         """Ensure storage directory exists"""
         if not os.path.exists(self.storage_dir):
             os.makedirs(self.storage_dir)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        os.makedirs(self.version_dir, exist_ok=True)
+
+    @contextmanager
+    def _timed(self, operation: str) -> Iterator[None]:
+        """Time a storage phase into the storage_operation_duration_seconds metric,
+        and as a storage.<operation> span when the request is being profiled"""
+        with STORAGE_OPERATION_SECONDS.time(backend=self.backend_name, operation=operation), \
+                span(f"storage.{operation}"):
+            yield
+
+    def _record_bytes(self, operation: str, kind: str, size: int) -> None:
+        STORAGE_BYTES.observe(size, backend=self.backend_name, operation=operation, kind=kind)
 
     def _get_user_file(self, user_id: str, data_type: str) -> str:
         return os.path.join(self.storage_dir, f"{user_id}_{data_type}.json")
 
+    def _get_transaction_paths(self, user_id: str) -> Tuple[str, str, str]:
+        """Return the (snapshot, compacting log, active log) paths holding a user's transactions"""
+        snapshot = os.path.join(self.storage_dir, f"{user_id}_transactions.ndjson")
+        log = os.path.join(self.storage_dir, f"{user_id}_transactions.log")
+        return snapshot, log + ".compacting", log
+
+    def _upgrade_legacy_snapshot(self, user_id: str) -> None:
+        """Rewrite a snapshot in the old indented-JSON format as an NDJSON snapshot"""
+        legacy_path = self._get_user_file(user_id, "transactions")
+        if not os.path.exists(legacy_path):
+            return
+        snapshot_path = self._get_transaction_paths(user_id)[0]
+        with self._user_lock(user_id):
+            if not os.path.exists(legacy_path):
+                return  # Another worker got here first
+            if not os.path.exists(snapshot_path):
+                with open(legacy_path, 'r') as f:
+                    data = json.load(f)
+                rows = TransactionIndex(data.get("transactions", [])).all()
+                self._write_snapshot(snapshot_path, rows, data.get("last_updated"))
+                logger.info(f"Upgraded {len(rows)} transactions for user {user_id} to the NDJSON snapshot format")
+            # Otherwise an earlier upgrade was interrupted after writing the snapshot
+            os.remove(legacy_path)
+
+    def _user_lock(self, user_id: str) -> UserLock:
+        """Return the lock serializing writes (and log reads) for one user"""
+        with self._user_locks_lock:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = UserLock(os.path.join(self.lock_dir, f"{user_id}.lock"))
+            return lock
+
+    def get_data_version(self, user_id: str) -> int:
+        """Return the user's data version, which every account/transaction save and every clean increases.
+
+        Versions are kept in their own files under versions/, which survive
+        clean_test_data, so a version number is never reused for other data.
+        """
+        self._flush_pending(user_id)
+        return self._read_version(user_id)
+
+    def _read_version(self, user_id: str) -> int:
+        try:
+            with open(os.path.join(self.version_dir, f"{user_id}.json"), 'r') as f:
+                return json.load(f).get("version", 0)
+        except FileNotFoundError:
+            return 0
+
+    def _bump_version(self, user_id: str) -> None:
+        # Bumped after the data is written, so a reader that sees the new
+        # version always reads the new data
+        with self._user_lock(user_id):
+            version = self._read_version(user_id) + 1
+            self._write_json_atomic(os.path.join(self.version_dir, f"{user_id}.json"), {"version": version})
+
+    def _write_json_atomic(self, file_path: str, data: Dict[str, Any]) -> None:
+        """Write data as JSON to file_path atomically"""
+        self._write_atomic(file_path, lambda f: f.write(json.dumps(data, indent=2).encode('utf-8')))
+
+    def _write_snapshot(self, file_path: str, rows: List[Dict[str, Any]], last_updated: Optional[str] = None) -> None:
+        """Write rows (newest first) as an NDJSON snapshot atomically, gzipped if configured"""
+        header = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "last_updated": last_updated or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "count": len(rows),
+        }
+
+        def write(f) -> None:
+            out = gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6, mtime=0) if self.compress_snapshots else f
+            out.write((json.dumps(header) + "\n").encode('utf-8'))
+            for i in range(0, len(rows), 1000):
+                out.write("".join(
+                    json.dumps(row, separators=(',', ':')) + "\n" for row in rows[i:i + 1000]
+                ).encode('utf-8'))
+            if out is not f:
+                out.close()
+
+        self._write_atomic(file_path, write)
+
+    def _write_atomic(self, file_path: str, write: Callable[[Any], None]) -> None:
+        """Call write(binary file) on a temp file beside file_path, then fsync and os.replace it into place"""
+        fd, temp_file_path = tempfile.mkstemp(
+            dir=self.storage_dir, prefix=os.path.basename(file_path) + '.', suffix='.tmp'
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise
+
+    @staticmethod
+    def _signature(paths: List[str]) -> Tuple[Optional[tuple], int]:
+        """Return a signature of the (mtime, size) of each path, or None if none exist, and their total size"""
+        signature = []
+        total_size = 0
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+                continue
+            signature.append((stat.st_mtime_ns, stat.st_size))
+            total_size += stat.st_size
+        if all(part is None for part in signature):
+            return None, 0
+        return tuple(signature), total_size
+
+    def _load_cached(self, user_id: str, data_type: str, parse: Callable[[Dict[str, Any]], Any]) -> Optional[Any]:
+        """Return parse(file contents) for a user file, reusing the cached value while the file is unchanged.
+
+        Returns None if the file does not exist. Cached values are shared between
+        callers and must not be mutated.
+        """
+        file_path = self._get_user_file(user_id, data_type)
+
+        def load() -> Any:
+            with open(file_path, 'r') as f:
+                return parse(json.load(f))
+
+        return self._cached(user_id, data_type, [file_path], load)
+
+    def _cached(self, user_id: str, data_type: str, paths: List[str], load: Callable[[], Any]) -> Optional[Any]:
+        """Return load(), reusing the cached value while none of the files in paths have changed"""
+        key = (user_id, data_type)
+        signature, size = self._signature(paths)
+        if signature is None:
+            self._invalidate(user_id, data_type)
+            return None
+
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == signature:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return entry[2]
+            self.cache_misses += 1
+
+        with self._timed("load"):
+            value = load()
+        self._record_bytes("load", "file", size)
+        self._cache_put(key, signature, size, value)
+        return value
+
+    def _cache_put(self, key: Tuple[str, str], signature: tuple, size: int, value: Any) -> None:
+        with self._cache_lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._cache_bytes -= old[1]
+            if size <= self.cache_max_bytes and self.cache_max_entries > 0:
+                self._cache[key] = (signature, size, value)
+                self._cache_bytes += size
+                while len(self._cache) > self.cache_max_entries or self._cache_bytes > self.cache_max_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_bytes -= evicted[1]
+
+    def _prime_cache(self, user_id: str, data_type: str, value: Any, paths: Optional[List[str]] = None) -> None:
+        """Cache a value that was just written, so the next read does not re-parse the files"""
+        signature, size = self._signature(paths or [self._get_user_file(user_id, data_type)])
+        if signature is None:
+            self._invalidate(user_id, data_type)
+            return
+        self._cache_put((user_id, data_type), signature, size, value)
+
+    def _invalidate(self, user_id: Optional[str] = None, data_type: Optional[str] = None) -> None:
+        """Drop cached entries for one user file, all of a user's files, or everything"""
+        with self._cache_lock:
+            for key in list(self._cache):
+                if (user_id is None or key[0] == user_id) and (data_type is None or key[1] == data_type):
+                    self._cache_bytes -= self._cache.pop(key)[1]
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Return cache hit/miss counters and current usage"""
+        with self._cache_lock:
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "entries": len(self._cache),
+                "bytes": self._cache_bytes,
+                "max_entries": self.cache_max_entries,
+                "max_bytes": self.cache_max_bytes,
+            }
+
     def save_accounts(self, user_id: str, accounts: List[Dict[str, Any]]):
         """Save account information"""
+        if self.write_behind_delay is not None:
+            self._queue_write(user_id, accounts=accounts)
+            return
+        self._write_accounts(user_id, accounts)
+
+    def _write_accounts(self, user_id: str, accounts: List[Dict[str, Any]]) -> None:
         file_path = self._get_user_file(user_id, "accounts")
-        
-        # Get existing accounts if any
-        existing_accounts = []
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                existing_accounts = data.get("accounts", [])
-        
-        # Create a set of existing account IDs
-        existing_account_ids = {acc.get("account_id") for acc in existing_accounts}
-        
-        # Filter out new accounts that already exist
-        new_accounts = [
-            acc for acc in accounts 
-            if acc.get("account_id") not in existing_account_ids
-        ]
-        
-        # Combine existing and new accounts
-        all_accounts = existing_accounts + new_accounts
-        
-        # Ensure each account has an institution_name
-        for account in all_accounts:
-            if "institution_name" not in account:
-                account["institution_name"] = "Unknown Institution"
-        
-        # Save all accounts
-        with open(file_path, 'w') as f:
-            json.dump({
+        with self._timed("save"), self._user_lock(user_id):
+            # Get existing accounts if any (copied, since cached values are shared)
+            existing_accounts = [dict(acc) for acc in self._read_accounts(user_id)]
+
+            # Create a set of existing account IDs
+            existing_account_ids = {acc.get("account_id") for acc in existing_accounts}
+
+            # Filter out new accounts that already exist, keeping the first copy of each
+            new_accounts = []
+            for acc in accounts:
+                if acc.get("account_id") not in existing_account_ids:
+                    existing_account_ids.add(acc.get("account_id"))
+                    new_accounts.append(dict(acc))
+
+            # Combine existing and new accounts
+            all_accounts = existing_accounts + new_accounts
+
+            # Ensure each account has an institution_name
+            for account in all_accounts:
+                if "institution_name" not in account:
+                    account["institution_name"] = "Unknown Institution"
+
+            # Save all accounts
+            self._write_json_atomic(file_path, {
                 "last_updated": datetime.now().isoformat(),
                 "accounts": all_accounts
-            }, f, indent=2)
-        
+            })
+            self._invalidate(user_id, "accounts")
+            self._bump_version(user_id)
+            self._record_bytes("save", "file", os.path.getsize(file_path))
+
         logger.info(f"Saved {len(new_accounts)} new accounts for user {user_id}")
         logger.info(f"Total accounts: {len(all_accounts)}")
 
@@ -68,194 +868,503 @@ class DataStorage:
         return data
 
     def save_transactions(self, user_id: str, transactions: List[Dict[str, Any]]) -> None:
-        """Save transactions for a user"""
-        temp_file_path = None
+        """Save transactions for a user, upserting them by transaction_id into the stored history.
+
+        Only rows that are new or differ from the stored copy are appended to
+        the user's transaction log, so the write cost tracks the delta.
+        """
         try:
             # Convert all date objects to strings recursively
             transactions = self._convert_dates_to_strings(transactions)
-            
-            file_path = self._get_user_file(user_id, "transactions")
-            # Write to a temporary file first
-            temp_file_path = file_path + '.tmp'
-            
-            # Prepare data for JSON serialization
-            data_to_save = {
-                "last_updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "transactions": transactions
-            }
-            
-            with open(temp_file_path, 'w') as f:
-                json.dump(data_to_save, f, indent=2)
-            
-            # If write was successful, rename temp file to actual file
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            os.rename(temp_file_path, file_path)
-            
-            logger.info(f"Saved {len(transactions)} transactions for user {user_id}")
+            if self.write_behind_delay is not None:
+                self._queue_write(user_id, transactions=transactions)
+                logger.info(f"Queued {len(transactions)} transactions for user {user_id}")
+                return
+            written, _ = self._write_transaction_changes(user_id, transactions, [])
+            logger.info(f"Saved {len(transactions)} transactions for user {user_id} ({written} new or changed)")
         except Exception as e:
             logger.error(f"Error saving transactions: {str(e)}")
-            # Clean up temp file if it exists
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
             raise
 
+    def _read_transaction_map(self, user_id: str) -> Dict[Any, Dict[str, Any]]:
+        """Merge the snapshot and log records into {transaction_id: transaction}"""
+        snapshot_path, compacting_path, log_path = self._get_transaction_paths(user_id)
+        transactions = {}
+        if os.path.exists(snapshot_path):
+            for transaction in iter_snapshot(snapshot_path):
+                transactions[transaction.get("transaction_id")] = transaction
+        for path in (compacting_path, log_path):
+            if os.path.exists(path):
+                self._apply_log(path, transactions)
+        return transactions
+
+    @staticmethod
+    def _apply_log(path: str, transactions: Dict[Any, Dict[str, Any]], deleted: Optional[set] = None) -> None:
+        """Apply a log's records to transactions, also tracking deleted ids in `deleted` if given"""
+        with open(path, 'r') as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only a torn final append can be incomplete; skip it
+                    logger.warning(f"Skipping unreadable record at {path}:{line_number}")
+                    continue
+                if record.get("op") == "delete":
+                    transactions.pop(record.get("transaction_id"), None)
+                    if deleted is not None:
+                        deleted.add(record.get("transaction_id"))
+                else:
+                    transaction = record["transaction"]
+                    transactions[transaction.get("transaction_id")] = transaction
+                    if deleted is not None:
+                        deleted.discard(transaction.get("transaction_id"))
+
+    def _write_transaction_changes(self, user_id: str, upserts: List[Dict[str, Any]],
+                                   removed: List[str]) -> Tuple[int, int]:
+        """Append upserts that differ from the stored rows, then deletes for removed ids.
+
+        Removals are applied after upserts, so an id both upserted and removed
+        in one call ends up deleted. Returns (records written, rows deleted).
+        """
+        paths = self._get_transaction_paths(user_id)
+        with self._timed("save"), self._user_lock(user_id):
+            index = self._get_transaction_index(user_id) or TransactionIndex([])
+            stored = index.by_id
+
+            removed_ids = set(removed)
+            upserted_ids = {transaction.get("transaction_id") for transaction in upserts}
+            changed = {}
+            for transaction in upserts:
+                transaction_id = transaction.get("transaction_id")
+                if transaction_id not in removed_ids and stored.get(transaction_id) != transaction:
+                    changed[transaction_id] = transaction
+            deleted = [transaction_id for transaction_id in dict.fromkeys(removed)
+                       if transaction_id in stored or transaction_id in upserted_ids]
+            if not changed and not deleted:
+                return 0, 0
+
+            records = [{"op": "upsert", "transaction": t} for t in changed.values()]
+            records.extend({"op": "delete", "transaction_id": transaction_id} for transaction_id in deleted)
+            payload = "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in records).encode('utf-8')
+            with open(paths[2], 'ab') as f:
+                f.write(payload)
+            self._bump_version(user_id)
+            self._prime_cache(
+                user_id, "transactions", index.updated(list(changed.values()), deleted), list(paths)
+            )
+            log_size = os.path.getsize(paths[2])
+            self._record_bytes("save", "payload", len(payload))
+            self._record_bytes("save", "file", log_size)
+
+        if log_size >= self.compact_threshold_bytes:
+            if self.background_compaction:
+                self._schedule_compaction(user_id)
+            else:
+                self.compact_transactions(user_id)
+        return len(records), len(deleted)
+
+    def compact_transactions(self, user_id: str) -> bool:
+        """Fold a user's transaction log into a new snapshot. Returns False if there was nothing to compact.
+
+        The active log is first renamed aside so writers can keep appending to
+        a fresh one while the merge runs without holding the user's lock.
+        """
+        self._upgrade_legacy_snapshot(user_id)
+        snapshot_path, compacting_path, log_path = self._get_transaction_paths(user_id)
+        with self._user_lock(user_id):
+            if not os.path.exists(compacting_path):
+                if not os.path.exists(log_path):
+                    return False
+                os.replace(log_path, compacting_path)
+            compacting = os.stat(compacting_path)
+
+        # Only compaction rewrites the snapshot, and the renamed log is immutable
+        with self._timed("compact"):
+            transactions = {}
+            try:
+                if os.path.exists(snapshot_path):
+                    for transaction in iter_snapshot(snapshot_path):
+                        transactions[transaction.get("transaction_id")] = transaction
+                self._apply_log(compacting_path, transactions)
+            except FileNotFoundError:
+                # Another worker finished compacting this log first
+                return False
+            rows = TransactionIndex(list(transactions.values())).all()
+
+        with self._timed("compact"), self._user_lock(user_id):
+            try:
+                current = os.stat(compacting_path)
+            except FileNotFoundError:
+                current = None
+            if current is None or (current.st_ino, current.st_mtime_ns) != (compacting.st_ino, compacting.st_mtime_ns):
+                # The user's data was cleaned, or another worker compacted it, while we were merging
+                return False
+            self._write_snapshot(snapshot_path, rows)
+            os.remove(compacting_path)
+            self._invalidate(user_id, "transactions")
+            self._record_bytes("compact", "file", os.path.getsize(snapshot_path))
+        logger.info(f"Compacted {len(rows)} transactions for user {user_id}")
+        return True
+
+    def _schedule_compaction(self, user_id: str) -> None:
+        with self._user_locks_lock:
+            if user_id in self._compaction_pending:
+                return
+            self._compaction_pending.add(user_id)
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(
+                    target=self._run_compactor, name="transaction-compactor", daemon=True
+                )
+                self._compactor.start()
+        self._compaction_queue.put(user_id)
+
+    def _run_compactor(self) -> None:
+        while True:
+            user_id = self._compaction_queue.get()
+            with self._user_locks_lock:
+                self._compaction_pending.discard(user_id)
+            try:
+                self.compact_transactions(user_id)
+            except Exception as e:
+                logger.error(f"Error compacting transactions for user {user_id}: {str(e)}")
+            finally:
+                self._compaction_queue.task_done()
+
+    def _queue_write(self, user_id: str, accounts: Optional[List[Dict[str, Any]]] = None,
+                     transactions: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Coalesce a save into the user's pending write-behind batch"""
+        with self._pending_lock:
+            pending = self._pending_writes.get(user_id)
+            if pending is None:
+                timer = threading.Timer(self.write_behind_delay, self._flush_queued, args=(user_id,))
+                timer.daemon = True
+                pending = self._pending_writes[user_id] = {"accounts": [], "transactions": {}, "timer": timer}
+                timer.start()
+            pending["accounts"].extend(accounts or [])
+            for transaction in transactions or []:
+                # Later saves of the same transaction win, as they would on disk
+                pending["transactions"].pop(transaction.get("transaction_id"), None)
+                pending["transactions"][transaction.get("transaction_id")] = transaction
+
+    def _flush_queued(self, user_id: str) -> None:
+        try:
+            self.flush(user_id)
+        except Exception as e:
+            logger.error(f"Error flushing queued writes for user {user_id}: {str(e)}")
+
+    def _flush_pending(self, user_id: str) -> None:
+        """Write out the user's queued saves before reading their data"""
+        if user_id in self._pending_writes:
+            self.flush(user_id)
+
+    def flush(self, user_id: Optional[str] = None) -> None:
+        """Write out saves queued by write-behind, for one user or all of them"""
+        with self._pending_lock:
+            user_ids = [user_id] if user_id is not None else list(self._pending_writes)
+        for queued_user_id in user_ids:
+            # Taking the batch under the user's lock orders it before any read waiting on that lock
+            with self._user_lock(queued_user_id):
+                with self._pending_lock:
+                    pending = self._pending_writes.pop(queued_user_id, None)
+                if pending is None:
+                    continue
+                pending["timer"].cancel()
+                if pending["accounts"]:
+                    self._write_accounts(queued_user_id, pending["accounts"])
+                if pending["transactions"]:
+                    transactions = list(pending["transactions"].values())
+                    written, _ = self._write_transaction_changes(queued_user_id, transactions, [])
+                    logger.info(f"Flushed {len(transactions)} queued transactions for user {queued_user_id} "
+                                f"({written} new or changed)")
+
+    def _drop_pending(self, user_id: Optional[str] = None) -> None:
+        with self._pending_lock:
+            for queued_user_id in [user_id] if user_id is not None else list(self._pending_writes):
+                pending = self._pending_writes.pop(queued_user_id, None)
+                if pending is not None:
+                    pending["timer"].cancel()
+
+    def save_item(self, user_id: str, item: Dict[str, Any]) -> None:
+        """Save a linked Plaid item (item_id, access_token, institution_name, cursor), replacing one with the same item_id"""
+        with self._user_lock(user_id):
+            items = [dict(existing) for existing in self.get_items(user_id)
+                     if existing.get("item_id") != item.get("item_id")]
+            items.append(dict(item))
+            self._write_items(user_id, items)
+
+    def update_item_cursor(self, user_id: str, item_id: str, cursor: Optional[str]) -> None:
+        """Record the transactions/sync cursor reached for an item"""
+        with self._user_lock(user_id):
+            items = [dict(item) for item in self.get_items(user_id)]
+            for item in items:
+                if item.get("item_id") == item_id:
+                    item["cursor"] = cursor
+                    item["last_synced"] = datetime.now().isoformat()
+                    break
+            else:
+                raise KeyError(f"Unknown item {item_id} for user {user_id}")
+            self._write_items(user_id, items)
+
+    def _write_items(self, user_id: str, items: List[Dict[str, Any]]) -> None:
+        # Access tokens live here, so never leave a half-written file behind
+        self._write_json_atomic(self._get_user_file(user_id, "items"), {
+            "last_updated": datetime.now().isoformat(),
+            "items": items
+        })
+        self._invalidate(user_id, "items")
+
+    def get_items(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get a user's linked Plaid items, including their access tokens and sync cursors"""
+        items = self._load_cached(user_id, "items", lambda data: data.get("items", []))
+        return items if items is not None else []
+
+    def apply_transaction_changes(self, user_id: str, added: List[Dict[str, Any]], modified: List[Dict[str, Any]],
+                                  removed: List[str]) -> Dict[str, int]:
+        """Apply a transactions/sync delta: upsert added and modified rows by transaction_id and drop removed ones.
+
+        The delta is written immediately, even with write-behind enabled, since
+        the caller advances the item's sync cursor once this returns.
+        """
+        upserts = self._convert_dates_to_strings(list(added) + list(modified))
+        with self._user_lock(user_id):
+            self._flush_pending(user_id)
+            _, deleted = self._write_transaction_changes(user_id, upserts, removed)
+        return {"added": len(added), "modified": len(modified), "removed": deleted}
+
     def get_accounts(self, user_id: str) -> List[Dict[str, Any]]:
         """获取账户信息"""
-        file_path = self._get_user_file(user_id, "accounts")
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                accounts = data.get("accounts", [])
-                # Ensure each account has an institution_name
-                for account in accounts:
-                    if "institution_name" not in account:
-                        account["institution_name"] = "Unknown Institution"
-                return accounts
-        return []
+        self._flush_pending(user_id)
+        return self._read_accounts(user_id)
+
+    def _read_accounts(self, user_id: str) -> List[Dict[str, Any]]:
+        def parse(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+            accounts = data.get("accounts", [])
+            # Ensure each account has an institution_name
+            for account in accounts:
+                if "institution_name" not in account:
+                    account["institution_name"] = "Unknown Institution"
+            return accounts
+
+        accounts = self._load_cached(user_id, "accounts", parse)
+        return accounts if accounts is not None else []
+
+    def _get_transaction_index(self, user_id: str) -> Optional[TransactionIndex]:
+        """Return the date index over a user's stored transactions, or None if there are none"""
+        def load() -> TransactionIndex:
+            with self._user_lock(user_id):
+                return TransactionIndex(list(self._read_transaction_map(user_id).values()))
+
+        self._upgrade_legacy_snapshot(user_id)
+        return self._cached(user_id, "transactions", list(self._get_transaction_paths(user_id)), load)
 
     def get_transactions(self, user_id: str, start_date: date = None, end_date: date = None) -> List[Dict[str, Any]]:
         """Get transactions for a user within the specified date range"""
         try:
-            file_path = self._get_user_file(user_id, "transactions")
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                    transactions = data.get("transactions", [])
-                    
-                    if not start_date or not end_date:
-                        return transactions
-                    
-                    # Filter transactions by date range
-                    filtered_transactions = []
-                    for transaction in transactions:
-                        try:
-                            transaction_date = datetime.strptime(transaction['date'], '%Y-%m-%d').date()
-                            if start_date <= transaction_date <= end_date:
-                                filtered_transactions.append(transaction)
-                        except (ValueError, KeyError) as e:
-                            logger.warning(f"Error parsing transaction date: {str(e)}")
-                            continue
-                    
-                    return filtered_transactions
-            return []
+            self._flush_pending(user_id)
+            if start_date and end_date and self._too_large_to_cache(user_id):
+                # Reading and filtering are one pass here, so both count as filtering
+                with self._timed("filter"):
+                    return self._stream_transactions(user_id, start_date, end_date)
+
+            index = self._get_transaction_index(user_id)
+            if index is None:
+                return []
+
+            with self._timed("filter"):
+                if not start_date or not end_date:
+                    return index.all()
+
+                # Bisect the sorted dates for the requested window
+                return index.range(start_date, end_date)
         except json.JSONDecodeError as e:
-            logger.error(f"Error reading transactions file: {str(e)}")
-            # If file is corrupted, remove it
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            # Writes are atomic, so this is real damage: leave the file in place for recovery
+            logger.error(f"Error reading transactions file for user {user_id}: {str(e)}")
+            self._invalidate(user_id, "transactions")
             return []
         except Exception as e:
             logger.error(f"Unexpected error reading transactions: {str(e)}")
             return []
 
-    def get_account_summary(self, user_id: str, start_date: date = None, end_date: date = None) -> Dict[str, Any]:
-        """Get detailed account summary information for the specified date range"""
+    def _too_large_to_cache(self, user_id: str) -> bool:
+        self._upgrade_legacy_snapshot(user_id)
+        return self._signature(list(self._get_transaction_paths(user_id)))[1] > self.cache_max_bytes
+
+    def _stream_transactions(self, user_id: str, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        """Read a date range straight from the files, for users whose index would not fit in the cache.
+
+        The logs are read first; snapshot rows are then decoded one line at a
+        time, and reading stops at the first row older than start_date since
+        snapshots are stored newest first.
+        """
+        snapshot_path, compacting_path, log_path = self._get_transaction_paths(user_id)
+        changes: Dict[Any, Dict[str, Any]] = {}
+        deleted = set()
+        with self._user_lock(user_id):
+            for path in (compacting_path, log_path):
+                if os.path.exists(path):
+                    self._apply_log(path, changes, deleted)
+
+        def ordinal_of(transaction: Dict[str, Any]) -> Optional[int]:
+            try:
+                return date.fromisoformat(transaction['date']).toordinal()
+            except (ValueError, KeyError, TypeError):
+                return None
+
+        lo, hi = start_date.toordinal(), end_date.toordinal()
+        keyed = []
+        if os.path.exists(snapshot_path):
+            for transaction in iter_snapshot(snapshot_path):
+                ordinal = ordinal_of(transaction)
+                if ordinal is None or ordinal < lo:
+                    break
+                transaction_id = transaction.get("transaction_id")
+                if ordinal <= hi and transaction_id not in changes and transaction_id not in deleted:
+                    keyed.append((ordinal, transaction_id or "", transaction))
+        for transaction in changes.values():
+            ordinal = ordinal_of(transaction)
+            if ordinal is not None and lo <= ordinal <= hi:
+                keyed.append((ordinal, transaction.get("transaction_id") or "", transaction))
+        keyed.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [item[2] for item in keyed]
+
+    def iter_transactions(self, user_id: str, start_date: date, end_date: date,
+                          after: Optional[Tuple[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a user's transactions within the date range, newest first.
+
+        Rows are ordered by (date, transaction_id) descending. Pass the
+        (date, transaction_id) of the last row received as `after` to resume
+        from the next one.
+        """
+        self._flush_pending(user_id)
+        index = self._get_transaction_index(user_id)
+        if index is None:
+            return iter(())
+        return index.iter_range(start_date, end_date, after)
+
+    def search_transactions(self, user_id: str, query: str, start_date: date = None, end_date: date = None,
+                            min_amount: float = None, max_amount: float = None, limit: int = 50,
+                            after: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """Find transactions with a word starting with each word of query in their name, merchant or category.
+
+        Matches are looked up in the inverted index kept alongside the cached
+        transaction index, which every save updates incrementally, so only
+        matching rows are read. At most `limit` of them are returned, newest
+        first; `after` resumes from a (date, transaction_id) key as in
+        iter_transactions. Rows without a valid date are never returned.
+        """
+        self._flush_pending(user_id)
+        index = self._get_transaction_index(user_id)
+        if index is None:
+            return []
+        def amount_ok(transaction: Dict[str, Any]) -> bool:
+            amount = float(transaction.get("amount") or 0)
+            return (min_amount is None or amount >= min_amount) and (max_amount is None or amount <= max_amount)
+
+        with self._timed("search"):
+            matched = index.search.match(query)
+            if len(matched) ** 2 > limit * len(index):
+                # Matches are dense enough that walking the dates newest first finds `limit`
+                # of them (after ~limit * len / matched rows) sooner than sorting them all
+                rows = (t for t in index.iter_range(start_date or date.min, end_date or date.max, after)
+                        if t.get("transaction_id") in matched and amount_ok(t))
+                return list(islice(rows, limit))
+
+            lo = start_date.isoformat() if start_date else None
+            hi = end_date.isoformat() if end_date else None
+            keyed = []
+            for transaction_id in matched:
+                transaction = index.by_id.get(transaction_id)
+                try:
+                    transaction_date = date.fromisoformat(transaction['date']).isoformat()
+                except (ValueError, KeyError, TypeError):
+                    continue
+                key = (transaction_date, transaction_id or "")
+                if ((lo and transaction_date < lo) or (hi and transaction_date > hi)
+                        or (after is not None and key >= after) or not amount_ok(transaction)):
+                    continue
+                keyed.append((key, transaction))
+            return [transaction for _, transaction in heapq.nlargest(limit, keyed, key=lambda item: item[0])]
+
+    def get_transaction_totals(self, user_id: str, start_date: date = None,
+                               end_date: date = None) -> Dict[str, Dict[Any, Dict[str, Any]]]:
+        """Get transaction totals and counts per category and per account_id within the date range.
+
+        Answered from the rollups kept alongside the cached transaction index,
+        which every save updates incrementally.
+        """
+        self._flush_pending(user_id)
+        index = self._get_transaction_index(user_id)
+        if index is None:
+            return {dimension: {} for dimension in TransactionRollups.DIMENSIONS}
+        with self._timed("rollup"):
+            return index.rollups.totals(start_date, end_date)
+
+    def get_account_totals(self, user_id: str, start_date: date = None, end_date: date = None) -> Dict[str, Dict[str, Any]]:
+        """Get transaction totals and counts per account_id within the date range"""
+        return self.get_transaction_totals(user_id, start_date, end_date)["account_id"]
+
+    def get_account_summary(self, user_id: str, start_date: date = None, end_date: date = None,
+                            detail: str = "full", include_ids: bool = False, top: int = 0) -> Dict[str, Any]:
+        """Get account summary information for the specified date range.
+
+        See build_account_summary for the "full" and "lean" detail levels.
+        Category and account totals come from the rollups, so a lean summary
+        without transaction IDs or top transactions reads no transaction rows.
+        """
         try:
             accounts = self.get_accounts(user_id)
-            transactions = self.get_transactions(user_id, start_date, end_date)
-            
-            # 1. Group accounts by financial institution
-            institutions = {}
-            for acc in accounts:
-                # Get institution name from the account data
-                institution_name = acc.get("institution_name", "Unknown Institution")
-                if institution_name not in institutions:
-                    institutions[institution_name] = {
-                        "accounts": [],
-                        "total_balance": 0.0,
-                        "recent_transactions": []
-                    }
-                institutions[institution_name]["accounts"].append(acc)
-                institutions[institution_name]["total_balance"] += float(acc.get("balances", {}).get("current", 0))
-            
-            # Log institution information for debugging
-            logger.info("Institution Summary:")
-            for inst_name, inst_data in institutions.items():
-                logger.info(f"Institution: {inst_name}")
-                logger.info(f"Number of accounts: {len(inst_data['accounts'])}")
-                logger.info(f"Total balance: ${inst_data['total_balance']:.2f}")
-                logger.info(f"Recent transactions: {len(inst_data['recent_transactions'])}")
-                logger.info("---")
-            
-            # 2. Get transactions for each institution within the date range
-            for institution in institutions.values():
-                institution["recent_transactions"] = [
-                    t for t in transactions 
-                    if any(t.get("account_id") == acc.get("account_id") for acc in institution["accounts"])
-                ]
-            
-            # 3. Group accounts by type and calculate totals
-            account_types = {}
-            for acc in accounts:
-                acc_type = acc.get("type", "unknown")
-                if acc_type not in account_types:
-                    account_types[acc_type] = {
-                        "accounts": [],
-                        "total_balance": 0.0,
-                        "recent_transactions": []
-                    }
-                account_types[acc_type]["accounts"].append(acc)
-                account_types[acc_type]["total_balance"] += float(acc.get("balances", {}).get("current", 0))
-                
-                # Get transactions for this account type within the date range
-                account_types[acc_type]["recent_transactions"] = [
-                    t for t in transactions 
-                    if any(t.get("account_id") == a.get("account_id") for a in account_types[acc_type]["accounts"])
-                ]
-            
-            # 4. Group transactions by category
-            categories = {}
-            total_recent_transactions = 0
-            
-            for transaction in transactions:
-                # Calculate total transactions
-                total_recent_transactions += float(transaction.get("amount", 0))
-                
-                # Group by category
-                category = transaction.get("category", ["Uncategorized"])[0]
-                if category not in categories:
-                    categories[category] = {
-                        "transactions": [],
-                        "total_amount": 0.0,
-                        "count": 0
-                    }
-                categories[category]["transactions"].append(transaction)
-                categories[category]["total_amount"] += float(transaction.get("amount", 0))
-                categories[category]["count"] += 1
-            
-            # Calculate overall totals
-            total_balance = sum(float(acc.get("balances", {}).get("current", 0)) for acc in accounts)
-
-            return {
-                "total_balance": total_balance,
-                "total_recent_transactions": total_recent_transactions,
-                "institutions": institutions,
-                "account_types": account_types,
-                "categories": categories,
-                "last_updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+            totals = self.get_transaction_totals(user_id, start_date, end_date)
+            account_totals = totals["account_id"] if detail == "lean" else None
+            if detail != "lean" or include_ids or top:
+                transactions = self._summary_transactions(user_id, start_date, end_date)
+            else:
+                transactions = []
+            with self._timed("aggregate"):
+                return build_account_summary(accounts, transactions, totals["category"], account_totals,
+                                             detail=detail, include_ids=include_ids, top=top)
         except Exception as e:
             logger.error(f"Error getting summary: {str(e)}")
             raise
 
+    def _summary_transactions(self, user_id: str, start_date: date = None, end_date: date = None):
+        """The transactions a summary routes: a slice of the columnar table when there is one, else a list"""
+        if start_date and end_date and not self._too_large_to_cache(user_id):
+            index = self._get_transaction_index(user_id)
+            if index is not None and TransactionTable.available():
+                # The first summary after a save builds the index's table
+                with self._timed("filter"):
+                    return index.table.slice(start_date, end_date)
+        return self.get_transactions(user_id, start_date, end_date)
+
     def clean_test_data(self, user_id: str = None) -> None:
         """Clean out test data. If user_id is provided, only clean that user's data."""
         try:
             if user_id:
                 # Clean specific user's data
-                for data_type in ["accounts", "transactions"]:
-                    file_path = self._get_user_file(user_id, data_type)
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        logger.info(f"Removed {data_type} data for user {user_id}")
+                with self._user_lock(user_id):
+                    self._drop_pending(user_id)
+                    for data_type in ["accounts", "transactions", "items"]:
+                        file_path = self._get_user_file(user_id, data_type)
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
+                            logger.info(f"Removed {data_type} data for user {user_id}")
+                    for file_path in self._get_transaction_paths(user_id):
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
+                    self._invalidate(user_id)
+                    self._bump_version(user_id)
             else:
-                # Clean all data
+                # Clean all data (lock files stay, since other workers may hold them)
+                self._drop_pending()
                 for filename in os.listdir(self.storage_dir):
-                    if filename.endswith('.json'):
+                    if filename.endswith(('.json', '.ndjson', '.log', '.log.compacting', '.tmp')):
                         file_path = os.path.join(self.storage_dir, filename)
                         os.remove(file_path)
                         logger.info(f"Removed {filename}")
+                self._invalidate()
+                for filename in os.listdir(self.version_dir):
+                    if filename.endswith('.json'):
+                        self._bump_version(filename[:-len('.json')])
         except Exception as e:
             logger.error(f"Error cleaning test data: {str(e)}")
             raise 
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""In-process stand-in for the Plaid API client, for benchmarks and local testing.
+
+FakePlaidClient implements the PlaidApi methods the backend calls and serves
+deterministic synthetic accounts and transactions, so ingestion can be
+exercised with tens of thousands of rows without a Plaid account. Swap it in
+for `main.plaid_client` to drive the API end to end.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+import plaid
+
+from synthetic import MERCHANTS, generate_accounts, generate_transactions
+
+
+class FakeResponse(dict):
+    """Dict response that also offers the SDK model's to_dict()"""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+
+def _field(request: Any, name: str, default: Any = None) -> Any:
+    """Read a field from an SDK request model or a plain dict"""
+    try:
+        value = request[name]
+    except (KeyError, TypeError, AttributeError, plaid.ApiAttributeError):
+        return default
+    return default if value is None else value
+
+
+class FakePlaidClient:
+    """Serve synthetic Plaid data for a single fake item.
+
+    latency adds a sleep to every call to mimic network round-trips, and
+    not_ready_attempts makes the first N transaction calls fail with
+    PRODUCT_NOT_READY like a freshly linked sandbox item.
+    """
+
+    def __init__(self, num_transactions: int = 1000, num_accounts: int = 3, years: float = 5,
+                 institution_name: str = "Fake Bank", latency: float = 0.0,
+                 not_ready_attempts: int = 0, seed: int = 0, institution_id: str = "ins_fake"):
+        self.institution_name = institution_name
+        self.institution_id = institution_id
+        self.item_id = f"item-{uuid.uuid4()}"
+        self.latency = latency
+        self.not_ready_attempts = not_ready_attempts
+        self.accounts = generate_accounts(num_accounts, seed=seed)
+        for account in self.accounts:
+            account.pop("institution_name", None)
+        # Plaid returns transactions newest first, with real date objects
+        self.transactions = sorted(
+            generate_transactions(self.accounts, num_transactions, years=years, seed=seed),
+            key=lambda t: (t["date"], t["transaction_id"]),
+            reverse=True,
+        )
+        for transaction in self.transactions:
+            transaction["date"] = date.fromisoformat(transaction["date"])
+        # Change log served by transactions_sync; a cursor is a position in it
+        self._changes: List[Tuple[str, Dict[str, Any]]] = [("added", t) for t in reversed(self.transactions)]
+        self._next_id = num_transactions
+        self._seed = seed
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, method: str) -> None:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _error(error_code: str) -> plaid.ApiException:
+        error = plaid.ApiException(status=400, reason="Bad Request")
+        error.body = json.dumps({"error_type": "ITEM_ERROR", "error_code": error_code})
+        return error
+
+    def link_token_create(self, request: Any) -> FakeResponse:
+        self._call("link_token_create")
+        return FakeResponse(link_token=f"link-sandbox-{uuid.uuid4()}")
+
+    def item_public_token_exchange(self, request: Any) -> FakeResponse:
+        self._call("item_public_token_exchange")
+        return FakeResponse(access_token=f"access-sandbox-{uuid.uuid4()}", item_id=self.item_id)
+
+    def accounts_get(self, request: Any) -> FakeResponse:
+        self._call("accounts_get")
+        return FakeResponse(
+            accounts=[dict(account) for account in self.accounts],
+            item={"item_id": self.item_id, "institution_id": self.institution_id},
+        )
+
+    def institutions_get_by_id(self, request: Any) -> FakeResponse:
+        self._call("institutions_get_by_id")
+        institution_id = _field(request, "institution_id")
+        return FakeResponse(institution={"institution_id": institution_id, "name": self.institution_name})
+
+    def transactions_get(self, request: Any) -> FakeResponse:
+        self._call("transactions_get")
+        with self._lock:
+            if self.not_ready_attempts > 0:
+                self.not_ready_attempts -= 1
+                raise self._error("PRODUCT_NOT_READY")
+
+        start_date = _field(request, "start_date")
+        end_date = _field(request, "end_date")
+        options = _field(request, "options", {})
+        count = _field(options, "count", 100)
+        offset = _field(options, "offset", 0)
+
+        matching: List[Dict[str, Any]] = [
+            t for t in self.transactions if start_date <= t["date"] <= end_date
+        ]
+        return FakeResponse(
+            accounts=[dict(account) for account in self.accounts],
+            transactions=[dict(t) for t in matching[offset:offset + count]],
+            total_transactions=len(matching),
+        )
+
+    def transactions_sync(self, request: Any) -> FakeResponse:
+        self._call("transactions_sync")
+        cursor = _field(request, "cursor", "")
+        count = _field(request, "count", 100)
+        with self._lock:
+            start = int(cursor) if cursor else 0
+            page = self._changes[start:start + count]
+            end = start + len(page)
+            has_more = end < len(self._changes)
+
+        return FakeResponse(
+            added=[dict(t) for kind, t in page if kind == "added"],
+            modified=[dict(t) for kind, t in page if kind == "modified"],
+            removed=[{"transaction_id": t["transaction_id"]} for kind, t in page if kind == "removed"],
+            next_cursor=str(end),
+            has_more=has_more,
+        )
+
+    def add_transactions(self, count: int, days_back: int = 7) -> List[Dict[str, Any]]:
+        """Simulate new transactions posting on the item"""
+        rng = random.Random(self._seed + self._next_id)
+        new = []
+        for _ in range(count):
+            merchant = rng.choice(MERCHANTS)
+            new.append({
+                "transaction_id": f"txn_{self._seed}_{self._next_id:08d}",
+                "account_id": rng.choice(self.accounts)["account_id"],
+                "amount": round(rng.uniform(-500, 500), 2),
+                "iso_currency_code": "USD",
+                "date": date.today() - timedelta(days=rng.randrange(days_back)),
+                "name": merchant,
+                "merchant_name": merchant,
+                "category": ["Shops"],
+                "pending": False,
+            })
+            self._next_id += 1
+        with self._lock:
+            self._changes.extend(("added", t) for t in new)
+            self._set_transactions(self.transactions + new)
+        return new
+
+    def modify_transaction(self, transaction_id: str, **changes) -> Dict[str, Any]:
+        """Simulate Plaid updating a transaction, e.g. a pending charge settling"""
+        with self._lock:
+            current = next(t for t in self.transactions if t["transaction_id"] == transaction_id)
+            updated = {**current, **changes}
+            self._changes.append(("modified", updated))
+            self._set_transactions([updated if t is current else t for t in self.transactions])
+        return updated
+
+    def remove_transaction(self, transaction_id: str) -> None:
+        """Simulate Plaid removing a transaction"""
+        with self._lock:
+            current = next(t for t in self.transactions if t["transaction_id"] == transaction_id)
+            self._changes.append(("removed", current))
+            self._set_transactions([t for t in self.transactions if t is not current])
+
+    def _set_transactions(self, transactions: List[Dict[str, Any]]) -> None:
+        self.transactions = sorted(transactions, key=lambda t: (t["date"], t["transaction_id"]), reverse=True)
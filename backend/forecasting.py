@@ -0,0 +1,252 @@
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+
+from metrics import FORECAST_TRAINING_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Each monthly prediction is made from the previous LAGS months plus the month of the year
+LAGS = 3
+# Passes over the training months on a full refit, and over the new months on an update
+REFIT_EPOCHS = 200
+UPDATE_EPOCHS = 20
+# Categories are refit from scratch at least this often (in months), and whenever a month
+# they were already trained on changes
+REFIT_EVERY = 12
+MODEL_FORMAT = 1
+
+History = Dict[str, Dict[str, float]]
+
+
+def month_index(month: str) -> int:
+    year, month_number = month.split("-")
+    return int(year) * 12 + int(month_number) - 1
+
+
+def month_label(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _features(values: np.ndarray, months: np.ndarray, positions: range) -> np.ndarray:
+    """One row per position: the LAGS previous values, then the month of the year as a point on a circle"""
+    angle = 2 * math.pi * (months[list(positions)] % 12) / 12
+    lags = [values[[p - lag for p in positions]] for lag in range(1, LAGS + 1)]
+    return np.column_stack(lags + [np.sin(angle), np.cos(angle)])
+
+
+def _new_model() -> SGDRegressor:
+    return SGDRegressor(alpha=1e-3, learning_rate="invscaling", eta0=0.01, random_state=0)
+
+
+def _update_category(state: Optional[Dict[str, Any]], monthly: Dict[str, float], current: int,
+                     window: int) -> Dict[str, Any]:
+    """Bring one category's model up to date with its completed months; returns its new state.
+
+    The model is refit on the last `window` months when there is none yet,
+    when a month it was trained on has changed (late or edited
+    transactions), or when REFIT_EVERY months have passed since the last
+    refit. Otherwise only the months completed since it was last trained
+    are fed to partial_fit.
+    """
+    first = min(month_index(month) for month in monthly)
+    months = np.arange(first, current)
+    values = np.array([monthly.get(month_label(m), 0.0) for m in months])
+    history = dict(zip(months.tolist(), values.tolist()))
+    if len(months) < LAGS + 2:
+        # Too little history to learn from; forecast the average month
+        return {"model": None, "history": history, "trained_through": None, "refit_at": None,
+                "average": float(values.mean()) if len(values) else 0.0, "mode": "average"}
+
+    trained_through = state and state.get("trained_through")
+    changed = trained_through is None or any(
+        abs(state["history"].get(m, 0.0) - history.get(m, 0.0)) > 0.005
+        for m in range(max(first, trained_through - window + 1), trained_through + 1)
+    )
+    if changed or current - 1 - state["refit_at"] >= REFIT_EVERY:
+        values, months = values[-window:], months[-window:]
+        scale = float(np.abs(values).mean()) or 1.0
+        scaled = values / scale
+        model = _new_model()
+        features, targets = _features(scaled, months, range(LAGS, len(months))), scaled[LAGS:]
+        for _ in range(REFIT_EPOCHS):
+            model.partial_fit(features, targets)
+        return {"model": model, "scale": scale, "history": history, "trained_through": current - 1,
+                "refit_at": current - 1, "mode": "refit"}
+
+    new_months = current - 1 - trained_through
+    state = {**state, "history": history, "trained_through": current - 1}
+    if new_months <= 0:
+        return {**state, "mode": "unchanged"}
+    scaled = values / state["scale"]
+    positions = range(len(months) - new_months, len(months))
+    features, targets = _features(scaled, months, positions), scaled[-new_months:]
+    for _ in range(UPDATE_EPOCHS):
+        state["model"].partial_fit(features, targets)
+    return {**state, "mode": "incremental"}
+
+
+def _predict(state: Dict[str, Any], current: int, horizon: int) -> List[float]:
+    """Forecast the current month and the horizon - 1 after it, feeding each prediction back in as a lag"""
+    if state["model"] is None:
+        return [round(state["average"], 2)] * horizon
+    scale = state["scale"]
+    values = [state["history"].get(m, 0.0) / scale for m in range(current - LAGS, current)]
+    predictions = []
+    for month in range(current, current + horizon):
+        angle = 2 * math.pi * (month % 12) / 12
+        row = np.array([[*values[::-1][:LAGS], math.sin(angle), math.cos(angle)]])
+        value = float(state["model"].predict(row)[0])
+        values.append(value)
+        predictions.append(round(value * scale, 2))
+    return predictions
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def train_user(directory: str, user_id: str, data_version: int, history: History,
+               current_month: str, horizon: int = 3, window: int = 36) -> Dict[str, Any]:
+    """Update a user's per-category models from their monthly totals and store the new forecast.
+
+    Runs in a worker process. history maps category -> {"YYYY-MM": net
+    amount}; months from current_month on are incomplete and not trained on.
+    The fitted models are kept in {user_id}.pkl and the forecast in
+    {user_id}.json, both under directory.
+    """
+    model_path = os.path.join(directory, f"{user_id}.pkl")
+    try:
+        with open(model_path, 'rb') as f:
+            saved = pickle.load(f)
+        states = saved["categories"] if saved.get("format") == MODEL_FORMAT else {}
+    except FileNotFoundError:
+        states = {}
+    except Exception as e:
+        logger.warning(f"Discarding unreadable forecast models for user {user_id}: {str(e)}")
+        states = {}
+
+    current = month_index(current_month)
+    categories = {}
+    new_states = {}
+    for category, monthly in history.items():
+        monthly = {month: amount for month, amount in monthly.items() if month_index(month) < current}
+        if not monthly:
+            continue
+        state = _update_category(states.get(category), monthly, current, window)
+        new_states[category] = state
+        categories[category] = {
+            "forecast": _predict(state, current, horizon),
+            "method": "sgd" if state["model"] is not None else "average",
+            "update": state["mode"],
+            "history_months": len(state["history"]),
+            "trained_through": month_label(state["trained_through"]) if state["trained_through"] is not None else None,
+        }
+
+    forecast = {
+        "user_id": user_id,
+        "data_version": data_version,
+        "trained_at": time.time(),
+        "months": [month_label(m) for m in range(current, current + horizon)],
+        "total": [round(sum(c["forecast"][h] for c in categories.values()), 2) for h in range(horizon)],
+        "categories": categories,
+    }
+    _write_atomic(model_path, pickle.dumps({"format": MODEL_FORMAT, "categories": new_states}))
+    _write_atomic(os.path.join(directory, f"{user_id}.json"), json.dumps(forecast).encode())
+    return forecast
+
+
+class Forecaster:
+    """Schedules forecast updates on a process pool and serves the stored forecasts.
+
+    At most one update per user runs at a time; saves arriving while one
+    runs are coalesced into a single follow-up run, so a forecast always
+    ends up trained on the latest data.
+    """
+
+    def __init__(self, directory: str, max_workers: int = 1, horizon: int = 3, window: int = 36):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.horizon = horizon
+        self.window = window
+        os.makedirs(directory, exist_ok=True)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._rerun: set = set()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Started on first use; spawned rather than forked, so workers do not inherit
+        # the server's threads and locks
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's stored forecast, or None if none has been trained yet"""
+        try:
+            with open(os.path.join(self.directory, f"{user_id}.json"), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable forecast for user {user_id}: {str(e)}")
+            return None
+
+    def is_training(self, user_id: str) -> bool:
+        return user_id in self._running
+
+    def schedule(self, user_id: str, load_history: Callable[[], Awaitable[Tuple[int, History]]]) -> None:
+        """Update the user's forecast in the background; load_history returns (data version, monthly totals)"""
+        if user_id in self._running:
+            self._rerun.add(user_id)
+            return
+        self._running[user_id] = asyncio.get_running_loop().create_task(self._run(user_id, load_history))
+
+    async def _run(self, user_id: str, load_history: Callable[[], Awaitable[Tuple[int, History]]]) -> None:
+        try:
+            while True:
+                self._rerun.discard(user_id)
+                started = time.perf_counter()
+                status = "error"
+                try:
+                    version, history = await load_history()
+                    forecast = await asyncio.get_running_loop().run_in_executor(
+                        self._pool(), train_user, self.directory, user_id, version, history,
+                        date.today().strftime("%Y-%m"), self.horizon, self.window,
+                    )
+                    status = "ok"
+                    logger.info(f"Updated forecast for user {user_id} ({len(forecast['categories'])} categories, "
+                                f"data version {version}) in {time.perf_counter() - started:.2f}s")
+                except Exception as e:
+                    logger.error(f"Error updating forecast for user {user_id}: {str(e)}")
+                finally:
+                    FORECAST_TRAINING_SECONDS.observe(time.perf_counter() - started, status=status)
+                if user_id not in self._rerun:
+                    break
+        finally:
+            self._running.pop(user_id, None)
+
+    def shutdown(self) -> None:
+        for task in self._running.values():
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
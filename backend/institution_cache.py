@@ -0,0 +1,109 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Plaid institution IDs look like "ins_109508"; anything else is not used as a file name
+_INSTITUTION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class InstitutionCache:
+    """TTL cache of Plaid institution metadata shared by all users.
+
+    Entries live in memory and in one JSON file per institution under
+    cache_dir, so every worker sharing the storage directory benefits from a
+    lookup made by any of them. Files are replaced atomically and carry the
+    time they were fetched, which is what the TTL is measured from.
+    """
+
+    def __init__(self, cache_dir: str, ttl_seconds: float = 7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+        self._memory: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, institution_id: str) -> Optional[str]:
+        if not _INSTITUTION_ID.match(institution_id or ""):
+            return None
+        return os.path.join(self.cache_dir, f"{institution_id}.json")
+
+    def _fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at < self.ttl_seconds
+
+    def get(self, institution_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached institution if it is fresh, else None"""
+        with self._lock:
+            entry = self._memory.get(institution_id)
+            if entry is not None and self._fresh(entry[0]):
+                self.memory_hits += 1
+                return entry[1]
+
+        path = self._path(institution_id)
+        if path is not None:
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                fetched_at, institution = data["fetched_at"], data["institution"]
+            except FileNotFoundError:
+                pass
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable institution cache file {path}: {str(e)}")
+            else:
+                if self._fresh(fetched_at):
+                    with self._lock:
+                        self._memory[institution_id] = (fetched_at, institution)
+                        self.disk_hits += 1
+                    return institution
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, institution_id: str, institution: Dict[str, Any]) -> None:
+        """Store freshly fetched institution metadata in memory and on disk"""
+        fetched_at = time.time()
+        with self._lock:
+            self._memory[institution_id] = (fetched_at, institution)
+
+        path = self._path(institution_id)
+        if path is None:
+            return
+        fd, temp_file_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f"{institution_id}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"fetched_at": fetched_at, "institution": institution}, f)
+            os.replace(temp_file_path, path)
+        except OSError as e:
+            # The in-memory entry still saves this worker the round-trip
+            logger.warning(f"Error writing institution cache file {path}: {str(e)}")
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+    def get_or_fetch(self, institution_id: str, fetch: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached institution, calling fetch(institution_id) and caching the result on a miss"""
+        institution = self.get(institution_id)
+        if institution is None:
+            institution = fetch(institution_id)
+            self.put(institution_id, institution)
+        return institution
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the number of institutions held in memory"""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "ttl_seconds": self.ttl_seconds,
+            }
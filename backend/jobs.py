@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Job ids are generated here; anything else is not used as a file name
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+FINISHED = ("succeeded", "failed", "cancelled")
+# Unfinished jobs' files are rewritten this often; one not rewritten for STALE_SECONDS is
+# taken to have lost its process
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 60
+# Tells this process apart from an earlier one given the same pid, e.g. after a container restart
+_PROCESS_ID = uuid.uuid4().hex
+
+
+class Job:
+    """A background task's status and progress, as reported by /jobs/{job_id}"""
+
+    def __init__(self, kind: str, user_id: str):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        job = cls(data.get("kind"), data.get("user_id"))
+        for key in ("job_id", "status", "created_at", "started_at", "finished_at", "result", "error"):
+            setattr(job, key, data.get(key))
+        job.progress = dict(data.get("progress") or {})
+        return job
+
+
+class JobRunner:
+    """Runs background jobs on the event loop, at most max_concurrent at a time.
+
+    Each job's state is written to {job_id}.json under directory whenever it
+    changes, so any worker sharing the storage directory can report on a
+    job, and finished jobs can still be looked up after a restart. The
+    file also records the owning process (pid and host) and a heartbeat,
+    refreshed every HEARTBEAT_SECONDS while the job is unfinished. Jobs
+    still pending when the server stops are marked cancelled; a job whose
+    owner has exited or whose heartbeat is stale is marked failed by the
+    next runner to start or to read it. The newest max_stored finished
+    job files are kept.
+    """
+
+    def __init__(self, directory: str, max_concurrent: int = 2, max_stored: int = 1000):
+        self.directory = directory
+        self.max_concurrent = max_concurrent
+        self.max_stored = max_stored
+        os.makedirs(directory, exist_ok=True)
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Progress is reported from executor threads as well as the event loop
+        self._lock = threading.Lock()
+        self._fail_interrupted()
+
+    def _path(self, job_id: str) -> Optional[str]:
+        if not _JOB_ID.match(job_id or ""):
+            return None
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _save(self, job: Job) -> None:
+        with self._lock:
+            owner = {"pid": os.getpid(), "host": socket.gethostname(), "process": _PROCESS_ID}
+            data = json.dumps({**job.to_dict(), "owner": owner, "heartbeat_at": time.time()})
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(job.job_id))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable job file {path}: {str(e)}")
+            return None
+
+    def _abandoned(self, data: Dict[str, Any]) -> bool:
+        """Whether an unfinished job read from disk has lost the process that was running it"""
+        if data.get("status") in FINISHED or data.get("job_id") in self._jobs:
+            return False
+        if time.time() - (data.get("heartbeat_at") or 0) > STALE_SECONDS:
+            return True
+        owner = data.get("owner") or {}
+        if owner.get("host") != socket.gethostname():
+            return False
+        if owner.get("pid") == os.getpid():
+            return owner.get("process") != _PROCESS_ID
+        try:
+            os.kill(owner.get("pid"), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, TypeError):
+            pass
+        return False
+
+    def _fail_abandoned(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        job = Job.from_dict(data)
+        job.status = "failed"
+        job.error = "Interrupted: the server process running it stopped"
+        job.finished_at = datetime.now().isoformat()
+        self._save(job)
+        logger.warning(f"Marked abandoned job {job.job_id} ({job.kind} for user {job.user_id}) as failed")
+        return job.to_dict()
+
+    def _fail_interrupted(self) -> None:
+        """Mark abandoned job files (see _abandoned) as failed, so pollers stop waiting"""
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                data = self._read(os.path.join(self.directory, name))
+                if data is not None and self._abandoned(data):
+                    self._fail_abandoned(data)
+
+    def _prune(self) -> None:
+        """Delete the oldest finished job files beyond max_stored; unfinished ones, here or in other workers, are kept"""
+        names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        if len(names) <= self.max_stored:
+            return
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(self.directory, name)))
+        for name in names[:len(names) - self.max_stored]:
+            path = os.path.join(self.directory, name)
+            data = self._read(path)
+            if data is None or data.get("status") not in FINISHED:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            for job in list(self._jobs.values()):
+                self._save(job)
+
+    def submit(self, kind: str, user_id: str, func: Callable[[Job], Awaitable[Any]]) -> Job:
+        """Queue `await func(job)` to run in the background; its return value becomes the job's result"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        loop = asyncio.get_running_loop()
+        if self._heartbeat is None:
+            self._heartbeat = contextvars.Context().run(loop.create_task, self._beat())
+        job = Job(kind, user_id)
+        self._jobs[job.job_id] = job
+        self._save(job)
+        # Started from an empty context, so the job is not attributed to the request that
+        # submitted it (e.g. in its profile) after that request has finished
+        self._tasks[job.job_id] = contextvars.Context().run(loop.create_task, self._run(job, func))
+        return job
+
+    async def _run(self, job: Job, func: Callable[[Job], Awaitable[Any]]) -> None:
+        try:
+            async with self._semaphore:
+                job.status = "running"
+                job.started_at = datetime.now().isoformat()
+                self._save(job)
+                started = time.perf_counter()
+                try:
+                    job.result = await func(job)
+                    job.status = "succeeded"
+                except asyncio.CancelledError:
+                    job.status = "cancelled"
+                    raise
+                except Exception as e:
+                    logger.error(f"Job {job.job_id} ({job.kind} for user {job.user_id}) failed: {str(e)}")
+                    job.status = "failed"
+                    job.error = str(e)
+                finally:
+                    job.finished_at = datetime.now().isoformat()
+                    job.progress["seconds"] = round(time.perf_counter() - started, 3)
+                    self._save(job)
+            logger.info(f"Job {job.job_id} ({job.kind} for user {job.user_id}) {job.status} "
+                        f"in {job.progress['seconds']}s")
+        finally:
+            self._tasks.pop(job.job_id, None)
+            self._jobs.pop(job.job_id, None)
+            self._prune()
+
+    def update(self, job: Job, **progress: Any) -> None:
+        """Record progress (e.g. pages_fetched=3); safe to call from any thread"""
+        with self._lock:
+            job.progress.update(progress)
+        self._save(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job's current state, from memory if it runs here, else from its file"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            with self._lock:
+                return job.to_dict()
+        path = self._path(job_id)
+        data = self._read(path) if path is not None else None
+        if data is None:
+            return None
+        if self._abandoned(data):
+            return self._fail_abandoned(data)
+        data.pop("owner", None)
+        data.pop("heartbeat_at", None)
+        return data
+
+    def shutdown(self) -> None:
+        """Cancel pending jobs, recording them as cancelled now since their tasks may never run again"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        for job_id, task in list(self._tasks.items()):
+            task.cancel()
+            job = self._jobs.get(job_id)
+            if job is not None and job.status not in FINISHED:
+                job.status = "cancelled"
+                job.error = "Server shut down"
+                job.finished_at = datetime.now().isoformat()
+                self._save(job)
@@ -1,20 +1,35 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import plaid
 from plaid.api import plaid_api
 from plaid.model.accounts_get_request import AccountsGetRequest
-from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.institutions_get_by_id_request import InstitutionsGetByIdRequest
 from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
 from plaid.model.link_token_create_request import LinkTokenCreateRequest
 from plaid.model.country_code import CountryCode
 from plaid.model.products import Products
 from datetime import datetime, timedelta, date
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import base64
+import json
 import os
 from dotenv import load_dotenv
+from analytics import DIMENSIONS, INTERVALS, FrameCache, monthly_totals, spending_series, top_merchants, transactions_frame
+from async_utils import retry_async, run_in_executor
 from data_storage import DataStorage
+from forecasting import Forecaster
+from institution_cache import InstitutionCache
+from jobs import Job, JobRunner
+from metrics import CONTENT_TYPE, REGISTRY, CallbackMetric, InstrumentedClient, MetricsMiddleware
+from profiling import ProfileStore, ProfilingMiddleware, current_profile, run_profiled, span
+from response_cache import ResponseCache, etag_matches, make_etag
+from search_index import tokenize
+from responses import CompressionPolicy, FastJSONResponse, RouteGZipMiddleware, accepts_gzip, dumps
+from transaction_ingest import fetch_all_transactions, sync_transactions
 import logging
 import uuid
 
@@ -45,7 +60,23 @@ else:
     plaid_env = plaid.Environment.Sandbox
     logger.info("Using Sandbox environment")
 
-app = FastAPI(title="Personal Finance API")
+app = FastAPI(title="Personal Finance API", default_response_class=FastJSONResponse)
+
+# Gzip responses of at least GZIP_MIN_SIZE bytes; routes can override the threshold or opt out with None
+compression = CompressionPolicy(
+    minimum_size=int(os.getenv('GZIP_MIN_SIZE', '1024')),
+    compresslevel=int(os.getenv('GZIP_LEVEL', '6')),
+    routes={
+        "/summary/": 1024,
+        "/transactions/": 1024,
+        "/analytics/": 1024,
+        "/search/": 1024,
+        "/accounts/": 4096,
+        "/create_link_token": None,
+        "/exchange_token": None,
+    },
+)
+app.add_middleware(RouteGZipMiddleware, policy=compression)
 
 # Configure CORS
 app.add_middleware(
@@ -56,6 +87,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def plaid_error_code(error: Exception) -> str:
+    """Label a failed Plaid call by its Plaid error_code, falling back to the HTTP status or exception type"""
+    if isinstance(error, plaid.ApiException):
+        try:
+            return json.loads(error.body).get("error_code") or str(error.status)
+        except (TypeError, ValueError, AttributeError):
+            return str(error.status)
+    return type(error).__name__
+
 # Initialize Plaid client
 try:
     client_id = os.getenv('PLAID_CLIENT_ID')
@@ -76,14 +116,138 @@ try:
         }
     )
     api_client = plaid.ApiClient(configuration)
-    plaid_client = plaid_api.PlaidApi(api_client)
+    # Every SDK call is timed and its failures counted (plaid_request_* metrics)
+    plaid_client = InstrumentedClient(plaid_api.PlaidApi(api_client), error_label=plaid_error_code)
     logger.info(f"Plaid client initialized successfully in Sandbox mode")
 except Exception as e:
     logger.error(f"Failed to initialize Plaid client: {str(e)}")
     raise
 
-# Initialize data storage
-data_storage = DataStorage()
+# Number of transaction pages fetched concurrently per linked item
+PLAID_PAGE_WORKERS = int(os.getenv('PLAID_PAGE_WORKERS', '4'))
+# Attempts made while a newly linked item reports PRODUCT_NOT_READY
+PLAID_MAX_RETRIES = int(os.getenv('PLAID_MAX_RETRIES', '3'))
+
+# Blocking Plaid SDK and storage calls run on dedicated thread pools so a slow
+# bank link never stalls the event loop, and cannot starve storage reads
+plaid_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PLAID_EXECUTOR_WORKERS', '8')), thread_name_prefix="plaid"
+)
+storage_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('STORAGE_EXECUTOR_WORKERS', '4')), thread_name_prefix="storage"
+)
+
+async def call_plaid(func, *args, **kwargs):
+    """Run a blocking Plaid SDK call on the Plaid executor"""
+    with span(f"plaid.{getattr(func, '__name__', 'call')}"):
+        return await run_in_executor(plaid_executor, func, *args, **kwargs)
+
+async def call_storage(func, *args, **kwargs):
+    """Run a blocking DataStorage call on the storage executor (under cProfile when the request is profiled)"""
+    return await run_in_executor(storage_executor, run_profiled, func, *args, **kwargs)
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    plaid_executor.shutdown(wait=False)
+    storage_executor.shutdown(wait=False)
+
+# Initialize data storage (STORAGE_BACKEND=json|sqlite)
+storage_backend = os.getenv('STORAGE_BACKEND', 'json').lower()
+storage_dir = os.getenv('STORAGE_DIR', 'data')
+if storage_backend == 'sqlite':
+    from sqlite_storage import SQLiteDataStorage
+    data_storage = SQLiteDataStorage(storage_dir, os.getenv('SQLITE_PATH') or None)
+elif storage_backend == 'json':
+    # STORAGE_WRITE_BEHIND_SECONDS coalesces bursts of saves per user into one delayed write;
+    # STORAGE_COMPRESS=1 gzips transaction snapshots
+    write_behind = os.getenv('STORAGE_WRITE_BEHIND_SECONDS')
+    data_storage = DataStorage(
+        storage_dir,
+        write_behind_delay=float(write_behind) if write_behind else None,
+        compress_snapshots=os.getenv('STORAGE_COMPRESS', '0').lower() in ('1', 'true', 'yes'),
+    )
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND: {storage_backend}")
+logger.info(f"Using {storage_backend} storage backend in {storage_dir}")
+
+# Institution metadata shared by all users and workers (INSTITUTION_CACHE_TTL_HOURS, default a week)
+institution_cache = InstitutionCache(
+    os.path.join(storage_dir, "shared", "institutions"),
+    ttl_seconds=float(os.getenv('INSTITUTION_CACHE_TTL_HOURS', '168')) * 3600,
+)
+
+# On-demand request profiling (X-Profile: spans|cprofile with X-Profile-Token: $PROFILE_TOKEN);
+# disabled unless PROFILE_TOKEN is set. The newest PROFILE_MAX_STORED profiles are kept.
+profile_token = os.getenv('PROFILE_TOKEN') or None
+profile_store = ProfileStore(
+    os.path.join(storage_dir, "profiles"), max_profiles=int(os.getenv('PROFILE_MAX_STORED', '50'))
+)
+app.add_middleware(ProfilingMiddleware, store=profile_store, token=profile_token)
+
+# Outermost, so request latency includes compression, CORS handling and profiling
+app.add_middleware(MetricsMiddleware)
+
+# Serialized /summary and /transactions bodies, keyed by the user's data version
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256')),
+    max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+)
+
+# Per-user transaction DataFrames behind /analytics, rebuilt when the user's data version changes
+analytics_frames = FrameCache(
+    max_entries=int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', '64')),
+    max_bytes=int(os.getenv('ANALYTICS_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+)
+
+# Per-category spending forecasts, trained on a process pool (FORECAST_WORKERS) after saves
+# and stored under the storage directory; FORECAST_HORIZON_MONTHS months are predicted
+forecaster = Forecaster(
+    os.path.join(storage_dir, "forecasts"),
+    max_workers=int(os.getenv('FORECAST_WORKERS', '1')),
+    horizon=int(os.getenv('FORECAST_HORIZON_MONTHS', '3')),
+)
+
+@app.on_event("shutdown")
+def shutdown_forecaster():
+    forecaster.shutdown()
+
+# Transaction downloads for newly linked items run as background jobs, at most
+# INGEST_MAX_CONCURRENT at a time; their state is kept under the storage directory
+jobs = JobRunner(
+    os.path.join(storage_dir, "jobs"), max_concurrent=int(os.getenv('INGEST_MAX_CONCURRENT', '2'))
+)
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    jobs.shutdown()
+
+def all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """stats() of each cache by name; the institution cache's hits are split by tier, so they are summed"""
+    institutions = institution_cache.stats()
+    return {
+        "storage": data_storage.cache_stats(),
+        "responses": response_cache.stats(),
+        "analytics": analytics_frames.stats(),
+        "institutions": {**institutions, "hits": institutions["memory_hits"] + institutions["disk_hits"]},
+    }
+
+def cache_metric(name: str, documentation: str, field: str, type: str = "gauge") -> CallbackMetric:
+    """Expose one field of each cache's stats() as a metric labelled by cache"""
+    return CallbackMetric(
+        name, documentation, ("cache",),
+        lambda: {(cache,): stats[field] for cache, stats in all_cache_stats().items() if field in stats},
+        type=type,
+    )
+
+cache_metric("cache_hits_total", "Cache lookups answered from the cache", "hits", type="counter")
+cache_metric("cache_misses_total", "Cache lookups that had to load or compute the value", "misses", type="counter")
+cache_metric("cache_entries", "Entries currently held in memory", "entries")
+cache_metric("cache_bytes", "Approximate bytes currently held in memory", "bytes")
+
+@app.on_event("shutdown")
+def flush_storage():
+    # Write out any saves still queued by write-behind
+    data_storage.flush()
 
 class Account(BaseModel):
     account_id: str
@@ -106,6 +270,68 @@ class PublicTokenRequest(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
 
+def encode_cursor(transaction: Dict[str, Any]) -> str:
+    """Encode a transaction's (date, transaction_id) as an opaque pagination cursor"""
+    key = json.dumps([transaction.get("date"), transaction.get("transaction_id") or ""])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by encode_cursor back into (date, transaction_id)"""
+    try:
+        cursor_date, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        date.fromisoformat(cursor_date)
+        return cursor_date, str(transaction_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def cached_json_response(request: Request, user_id: str, key: tuple, compute) -> Response:
+    """Serve the JSON body of `await compute()` through the response cache, with ETag/304 support.
+
+    key identifies the response for a given version of the user's data; the
+    version is read before computing, so a save racing with this request can
+    only make the cached body newer than its key, never older. Bodies over
+    the route's gzip threshold are compressed once, off the event loop, and
+    the compressed copy is cached too; it gets its own ETag. Profiled
+    requests bypass the cache and If-None-Match, so the work is measured.
+    """
+    version = await call_storage(data_storage.get_data_version, user_id)
+    key = (user_id, version, *key)
+    etag = make_etag(key)
+    gzip_etag = etag[:-1] + '-gzip"'
+    headers = {"Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    profiling = current_profile() is not None
+    if_none_match = request.headers.get("if-none-match")
+    for tag in (etag, gzip_etag):
+        if not profiling and etag_matches(if_none_match, tag):
+            return Response(status_code=304, headers={**headers, "ETag": tag})
+
+    body = None if profiling else response_cache.get(key)
+    if body is None:
+        content = await compute()
+        with span("serialize"):
+            body = run_profiled(dumps, content)
+        response_cache.put(key, body)
+
+    minimum_size = compression.minimum_size_for(request.url.path)
+    if minimum_size is not None and len(body) >= minimum_size and accepts_gzip(request.headers):
+        compressed = None if profiling else response_cache.get(key + ("gzip",))
+        if compressed is None:
+            with span("compress"):
+                compressed = await run_in_executor(None, run_profiled, compression.compress, body)
+            response_cache.put(key + ("gzip",), compressed)
+        return Response(content=compressed, media_type="application/json",
+                        headers={**headers, "ETag": gzip_etag, "Content-Encoding": "gzip"})
+    return Response(content=body, media_type="application/json", headers={**headers, "ETag": etag})
+
+async def stream_ndjson(rows, batch_size: int = 500):
+    """Yield rows as newline-delimited JSON, reading them in batches on the storage executor"""
+    rows = iter(rows)
+    while True:
+        batch = await call_storage(lambda: list(islice(rows, batch_size)))
+        if not batch:
+            break
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Personal Finance API"}
@@ -153,8 +379,8 @@ async def create_link_token():
         logger.info(f"Request configuration: {request_dict}")
         
         try:
-            response = plaid_client.link_token_create(request)
-            logger.info(f"Raw response from Plaid: {response}")
+            response = await call_plaid(plaid_client.link_token_create, request)
+            logger.debug(f"Raw response from Plaid: {response}")
         except plaid.ApiException as e:
             logger.error(f"Plaid API error details:")
             logger.error(f"Status Code: {e.status}")
@@ -189,6 +415,54 @@ async def create_link_token():
             detail=f"Internal server error: {str(e)}"
         )
 
+def is_product_not_ready(error: Exception) -> bool:
+    """True for the error Plaid returns while a freshly linked item is still being prepared"""
+    return isinstance(error, plaid.ApiException) and error.status == 400 and "PRODUCT_NOT_READY" in str(error)
+
+def fetch_institution(institution_id: str) -> Dict[str, Any]:
+    """Look up an institution's metadata from Plaid (blocking)"""
+    response = plaid_client.institutions_get_by_id(InstitutionsGetByIdRequest(
+        institution_id=institution_id,
+        country_codes=[CountryCode("US"), CountryCode("CA")],
+    ))
+    return {"institution_id": institution_id, "name": response['institution']['name']}
+
+async def ingest_transactions(job: Job, user_id: str, access_token: str, start_date: date,
+                              end_date: date) -> Dict[str, Any]:
+    """Download an item's transaction history and save it, reporting progress on the job"""
+    attempts = 0
+
+    def on_page(pages_fetched: int, pages_total: int) -> None:
+        jobs.update(job, pages_fetched=pages_fetched, pages_total=pages_total)
+
+    async def fetch():
+        nonlocal attempts
+        attempts += 1
+        jobs.update(job, attempts=attempts)
+        return await call_plaid(
+            fetch_all_transactions, plaid_client, access_token, start_date, end_date,
+            max_workers=PLAID_PAGE_WORKERS, on_page=on_page
+        )
+
+    # Page through the whole history, backing off while the item is not ready yet
+    logger.info(f"Requesting transactions from {start_date} to {end_date}")
+    transactions, ingest_stats = await retry_async(
+        fetch, should_retry=is_product_not_ready, attempts=PLAID_MAX_RETRIES
+    )
+    logger.info(f"Retrieved {len(transactions)} transactions")
+    jobs.update(job, rows_fetched=len(transactions))
+
+    # Convert dates to strings before saving to storage
+    for transaction in transactions:
+        if 'date' in transaction and isinstance(transaction['date'], (datetime, date)):
+            transaction['date'] = transaction['date'].strftime('%Y-%m-%d')
+
+    await call_storage(data_storage.save_transactions, user_id, transactions)
+    jobs.update(job, rows_saved=len(transactions))
+    schedule_forecast(user_id)
+    logger.info(f"Saved {len(transactions)} transactions for user {user_id}")
+    return ingest_stats
+
 @app.post("/exchange_token")
 async def exchange_public_token(request: PublicTokenRequest):
     try:
@@ -202,97 +476,68 @@ async def exchange_public_token(request: PublicTokenRequest):
         )
         
         logger.info("Calling Plaid API to exchange token")
-        exchange_response = plaid_client.item_public_token_exchange(exchange_request)
+        exchange_response = await call_plaid(plaid_client.item_public_token_exchange, exchange_request)
         access_token = exchange_response['access_token']
         logger.info("Successfully exchanged public token for access token")
         
-        # Get account information
-        logger.info("Fetching account information")
+        # Get account information, then the institution's name (usually from the shared cache)
+        logger.info("Fetching account and institution information")
         accounts_request = AccountsGetRequest(access_token=access_token)
-        accounts_response = plaid_client.accounts_get(accounts_request)
-        accounts = accounts_response.to_dict()['accounts']
+        accounts_response = (await call_plaid(plaid_client.accounts_get, accounts_request)).to_dict()
+        accounts = accounts_response['accounts']
         logger.info(f"Retrieved {len(accounts)} accounts")
         
-        # Get institution information
         try:
-            institution_response = plaid_client.institutions_get_by_id(
-                request_id=str(uuid.uuid4()),
-                institution_id=exchange_response['item']['institution_id'],
-                country_codes=[CountryCode("CA")]
-            )
-            institution_name = institution_response['institution']['name']
+            institution_id = (accounts_response.get('item') or {}).get('institution_id')
+            if not institution_id:
+                raise ValueError("Item has no institution_id")
+            institution = await call_plaid(institution_cache.get_or_fetch, institution_id, fetch_institution)
+            institution_name = institution['name']
             logger.info(f"Retrieved institution name: {institution_name}")
-            
-            # Add institution name to each account
-            for account in accounts:
-                account['institution_name'] = institution_name
-                logger.info(f"Added institution name '{institution_name}' to account {account.get('name', 'Unknown')}")
         except Exception as e:
             logger.warning(f"Failed to get institution name: {str(e)}")
             # If we can't get the institution name, use a default
-            for account in accounts:
-                account['institution_name'] = "Unknown Institution"
-                logger.warning(f"Using default institution name 'Unknown Institution' for account {account.get('name', 'Unknown')}")
+            institution_name = "Unknown Institution"
+
+        # Add institution name to each account
+        for account in accounts:
+            account['institution_name'] = institution_name
+            logger.debug(f"Added institution name '{institution_name}' to account {account.get('name', 'Unknown')}")
         
-        # Save accounts with institution information
+        # Save accounts with institution information, and the item so it can be refreshed later
         logger.info("Saving account information")
-        data_storage.save_accounts(request.user_id, accounts)
-        
-        # Wait for item to be ready before fetching transactions
-        max_retries = 3
-        retry_delay = 2  # seconds
+        await call_storage(data_storage.save_accounts, request.user_id, accounts)
+        await call_storage(data_storage.save_item, request.user_id, {
+            "item_id": exchange_response['item_id'],
+            "access_token": access_token,
+            "institution_name": institution_name,
+            "cursor": None
+        })
         
-        for attempt in range(max_retries):
-            try:
-                # Get transaction information
-                logger.info(f"Fetching transaction information (attempt {attempt + 1}/{max_retries})")
-                
-                # Use provided date range or default to 5 years
-                if request.start_date and request.end_date:
-                    start_date = datetime.strptime(request.start_date, '%Y-%m-%d').date()
-                    end_date = datetime.strptime(request.end_date, '%Y-%m-%d').date()
-                    logger.info(f"Using provided date range: {start_date} to {end_date}")
-                else:
-                    end_date = datetime.now().date()
-                    start_date = end_date - timedelta(days=365*5)  # 5 years
-                    logger.info(f"Using default date range: {start_date} to {end_date}")
-                
-                # Keep dates as date objects for Plaid API
-                transactions_request = TransactionsGetRequest(
-                    access_token=access_token,
-                    start_date=start_date,
-                    end_date=end_date,
-                    options={"count": 500}  # Increased count to get more transactions
-                )
-                
-                logger.info(f"Requesting transactions from {start_date} to {end_date}")
-                transactions_response = plaid_client.transactions_get(transactions_request)
-                transactions = transactions_response.to_dict()['transactions']
-                logger.info(f"Retrieved {len(transactions)} transactions")
-                
-                # Convert dates to strings before saving to storage
-                for transaction in transactions:
-                    if 'date' in transaction and isinstance(transaction['date'], (datetime, date)):
-                        transaction['date'] = transaction['date'].strftime('%Y-%m-%d')
-                
-                # Save transactions
-                logger.info("Saving transaction information")
-                data_storage.save_transactions(request.user_id, transactions)
-                break  # Success, exit retry loop
-                
-            except plaid.ApiException as e:
-                if e.status == 400 and "PRODUCT_NOT_READY" in str(e):
-                    if attempt < max_retries - 1:
-                        logger.info(f"Product not ready, waiting {retry_delay} seconds before retry...")
-                        import time
-                        time.sleep(retry_delay)
-                        continue
-                raise  # Re-raise if it's not a PRODUCT_NOT_READY error or we're out of retries
+        # Use provided date range or default to 5 years
+        if request.start_date and request.end_date:
+            start_date = datetime.strptime(request.start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.end_date, '%Y-%m-%d').date()
+            logger.info(f"Using provided date range: {start_date} to {end_date}")
+        else:
+            end_date = datetime.now().date()
+            start_date = end_date - timedelta(days=365*5)  # 5 years
+            logger.info(f"Using default date range: {start_date} to {end_date}")
         
-        logger.info("Data saved successfully")
+        # The history download can take a while; hand it to a background job and let the
+        # client poll /jobs/{job_id}
+        user_id = request.user_id
+        job = jobs.submit(
+            "ingest", user_id,
+            lambda job: ingest_transactions(job, user_id, access_token, start_date, end_date)
+        )
+        logger.info(f"Queued transaction download for user {user_id} as job {job.job_id}")
         return {
             "message": "Successfully connected account",
-            "institution_name": institution_name if 'institution_name' in locals() else "Unknown Institution"
+            "institution_name": institution_name,
+            "accounts": len(accounts),
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}"
         }
         
     except plaid.ApiException as e:
@@ -309,17 +554,86 @@ async def exchange_public_token(request: PublicTokenRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """A background job's status (queued, running, succeeded, failed or cancelled), progress and result.
+
+    For the ingest jobs /exchange_token starts, progress has pages_fetched
+    and pages_total while downloading, then rows_fetched and rows_saved.
+    """
+    job = await call_storage(jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/refresh/{user_id}")
+async def refresh_transactions(user_id: str):
+    """Pull only what changed since the last refresh for each of the user's linked items.
+
+    Uses Plaid transactions/sync with the cursor stored per item. The first
+    refresh after linking starts without a cursor and pages through the
+    item's history once.
+    """
+    try:
+        items = await call_storage(data_storage.get_items, user_id)
+        if not items:
+            raise HTTPException(status_code=404, detail="No linked items for this user")
+
+        async def refresh_item(item: Dict[str, Any]) -> Dict[str, Any]:
+            changes = await call_plaid(sync_transactions, plaid_client, item["access_token"], item.get("cursor"))
+            counts = await call_storage(
+                data_storage.apply_transaction_changes,
+                user_id, changes["added"], changes["modified"], changes["removed"]
+            )
+            # Only advance the cursor once the changes are stored; re-applying is harmless
+            await call_storage(data_storage.update_item_cursor, user_id, item["item_id"], changes["next_cursor"])
+            return {
+                "item_id": item["item_id"],
+                "institution_name": item.get("institution_name"),
+                "pages": changes["pages"],
+                **counts
+            }
+
+        # Items share the user's transaction store, so apply them one at a time
+        results = [await refresh_item(item) for item in items]
+        if any(result["added"] or result["modified"] or result["removed"] for result in results):
+            schedule_forecast(user_id)
+        logger.info(f"Refreshed {len(results)} items for user {user_id}")
+        return {"items": results}
+    except HTTPException:
+        raise
+    except plaid.ApiException as e:
+        logger.error(f"Plaid API error: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Plaid API error: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Error refreshing transactions: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
 @app.get("/accounts/{user_id}")
 async def get_accounts(user_id: str):
     try:
-        accounts = data_storage.get_accounts(user_id)
+        accounts = await call_storage(data_storage.get_accounts, user_id)
         return {"accounts": accounts}
     except Exception as e:
         logger.error(f"Error getting accounts: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/transactions/{user_id}")
-async def get_transactions(user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+async def get_transactions(request: Request, user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                           limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Get transactions, newest first.
+
+    Without limit or cursor the whole range is returned as one list. With
+    them, at most `limit` rows are returned along with a `next_cursor` to pass
+    back for the following page. Sending `Accept: application/x-ndjson`
+    streams the rows as newline-delimited JSON instead.
+    """
     try:
         # If no dates provided, default to last 30 days
         if not start_date or not end_date:
@@ -337,9 +651,38 @@ async def get_transactions(user_id: str, start_date: Optional[str] = None, end_d
                 status_code=400,
                 detail="Date range cannot exceed 10 years"
             )
-            
-        transactions = data_storage.get_transactions(user_id, start_date, end_date)
-        return {"transactions": transactions}
+
+        if limit is not None and not 1 <= limit <= 1000:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+        after = decode_cursor(cursor) if cursor else None
+
+        if "application/x-ndjson" in request.headers.get("accept", ""):
+            rows = await call_storage(data_storage.iter_transactions, user_id, start_date, end_date, after)
+            if limit is not None:
+                rows = islice(rows, limit)
+            return StreamingResponse(stream_ndjson(rows), media_type="application/x-ndjson")
+
+        if limit is None and after is None:
+            async def compute():
+                transactions = await call_storage(data_storage.get_transactions, user_id, start_date, end_date)
+                return {"transactions": transactions}
+
+            return await cached_json_response(request, user_id, ("transactions", start_date, end_date), compute)
+
+        limit = limit or 100
+
+        async def compute_page():
+            page = await call_storage(
+                lambda: list(islice(data_storage.iter_transactions(user_id, start_date, end_date, after), limit + 1))
+            )
+            next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+            return {"transactions": page[:limit], "next_cursor": next_cursor}
+
+        return await cached_json_response(
+            request, user_id, ("transactions", start_date, end_date, limit, after), compute_page
+        )
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Invalid date format: {str(e)}")
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
@@ -348,7 +691,11 @@ async def get_transactions(user_id: str, start_date: Optional[str] = None, end_d
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/summary/{user_id}")
-async def get_summary(user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+async def get_summary(request: Request, user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      detail: str = "full", include_ids: bool = False, top: int = 0):
+    """Get the account summary. detail=lean returns per-bucket counts and totals
+    (plus transaction IDs with include_ids=true and the `top` most recent
+    transactions per bucket) instead of embedding every transaction."""
     try:
         # If no dates provided, default to last 30 days
         if not start_date or not end_date:
@@ -366,9 +713,23 @@ async def get_summary(user_id: str, start_date: Optional[str] = None, end_date:
                 status_code=400,
                 detail="Date range cannot exceed 10 years"
             )
+
+        if detail not in ("full", "lean"):
+            raise HTTPException(status_code=400, detail="detail must be 'full' or 'lean'")
+        if not 0 <= top <= 100:
+            raise HTTPException(status_code=400, detail="top must be between 0 and 100")
             
-        summary = data_storage.get_account_summary(user_id, start_date, end_date)
-        return summary
+        async def compute():
+            return await call_storage(
+                data_storage.get_account_summary,
+                user_id, start_date, end_date, detail=detail, include_ids=include_ids, top=top
+            )
+
+        return await cached_json_response(
+            request, user_id, ("summary", start_date, end_date, detail, include_ids, top), compute
+        )
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Invalid date format: {str(e)}")
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
@@ -376,11 +737,215 @@ async def get_summary(user_id: str, start_date: Optional[str] = None, end_date:
         logger.error(f"Error getting summary: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+def parse_date_range(start_date: Optional[str], end_date: Optional[str]) -> tuple:
+    """Parse optional YYYY-MM-DD bounds; raises ValueError on a malformed date"""
+    start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    return start, end
+
+async def analytics_frame(user_id: str, version: Optional[int] = None):
+    """The user's transactions as a DataFrame, built once per data version"""
+    if version is None:
+        version = await call_storage(data_storage.get_data_version, user_id)
+    return await call_storage(
+        analytics_frames.get, user_id, version,
+        lambda: transactions_frame(data_storage.get_transactions(user_id)),
+    )
+
+@app.get("/analytics/{user_id}/series")
+async def get_spending_series(request: Request, user_id: str, interval: str = "month", by: str = "category",
+                              start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              window: int = 3, limit: int = 10):
+    """Spending per month or week for each category or merchant, with `window`-period rolling
+    averages and period-over-period changes. Without dates the whole history is covered."""
+    try:
+        start, end = parse_date_range(start_date, end_date)
+        if interval not in INTERVALS:
+            raise HTTPException(status_code=400, detail="interval must be 'month' or 'week'")
+        if by not in DIMENSIONS:
+            raise HTTPException(status_code=400, detail="by must be 'category' or 'merchant'")
+        if not 1 <= window <= 24:
+            raise HTTPException(status_code=400, detail="window must be between 1 and 24")
+        if not 1 <= limit <= 50:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 50")
+
+        async def compute():
+            frame = await analytics_frame(user_id)
+            return await call_storage(spending_series, frame, interval, by, start, end, window, limit)
+
+        return await cached_json_response(
+            request, user_id, ("analytics.series", interval, by, start, end, window, limit), compute
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Invalid date format: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    except Exception as e:
+        logger.error(f"Error getting spending series: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/{user_id}/merchants")
+async def get_top_merchants(request: Request, user_id: str, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None, limit: int = 10):
+    """The merchants with the most money out in the range"""
+    try:
+        start, end = parse_date_range(start_date, end_date)
+        if not 1 <= limit <= 100:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+
+        async def compute():
+            frame = await analytics_frame(user_id)
+            return await call_storage(top_merchants, frame, start, end, limit)
+
+        return await cached_json_response(request, user_id, ("analytics.merchants", start, end, limit), compute)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Invalid date format: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    except Exception as e:
+        logger.error(f"Error getting top merchants: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/search/{user_id}")
+async def search_transactions(request: Request, user_id: str, q: str, start_date: Optional[str] = None,
+                              end_date: Optional[str] = None, min_amount: Optional[float] = None,
+                              max_amount: Optional[float] = None, limit: int = 50, cursor: Optional[str] = None):
+    """Search transactions by name, merchant and category, newest first.
+
+    Every word of q must start a word of the transaction (so "star cof"
+    finds "Starbucks Coffee"). Results can be narrowed by date and amount,
+    and come in pages of `limit` with a `next_cursor` to pass back as cursor.
+    """
+    try:
+        terms = tokenize(q)
+        if not terms:
+            raise HTTPException(status_code=400, detail="q must contain at least one word")
+        if not 1 <= limit <= 500:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+        start, end = parse_date_range(start_date, end_date)
+        after = decode_cursor(cursor) if cursor else None
+
+        async def compute():
+            page = await call_storage(
+                data_storage.search_transactions,
+                user_id, q, start, end, min_amount, max_amount, limit + 1, after
+            )
+            next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+            return {"transactions": page[:limit], "next_cursor": next_cursor}
+
+        return await cached_json_response(
+            request, user_id, ("search", tuple(terms), start, end, min_amount, max_amount, limit, after), compute
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Invalid date format: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    except Exception as e:
+        logger.error(f"Error searching transactions: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+def schedule_forecast(user_id: str) -> None:
+    """Retrain the user's forecast in the background from their monthly category totals"""
+    async def load_history():
+        version = await call_storage(data_storage.get_data_version, user_id)
+        frame = await analytics_frame(user_id, version)
+        return version, await call_storage(monthly_totals, frame)
+
+    forecaster.schedule(user_id, load_history)
+
+@app.get("/forecast/{user_id}")
+async def get_forecast(user_id: str):
+    """The user's stored spending forecast per category, with how stale it is.
+
+    Forecasts are never computed here; they are trained in the background
+    after each save of the user's transactions. While the first one is
+    being trained this returns 202 with status "training", and 404 if there
+    is none.
+    """
+    try:
+        forecast = await call_storage(forecaster.get, user_id)
+        if forecast is None and not forecaster.is_training(user_id):
+            raise HTTPException(status_code=404, detail="No forecast for this user; link an account first")
+        version = await call_storage(data_storage.get_data_version, user_id)
+        current_month = date.today().strftime("%Y-%m")
+        stale = forecast is None or forecast["data_version"] != version or forecast["months"][0] != current_month
+        staleness = {
+            "stale": stale,
+            "training": forecaster.is_training(user_id),
+            "data_version": version,
+            "trained_on_version": forecast and forecast["data_version"],
+            "trained_at": forecast and datetime.fromtimestamp(forecast["trained_at"]).isoformat(timespec="seconds"),
+            "age_seconds": forecast and round(datetime.now().timestamp() - forecast["trained_at"], 1),
+        }
+        if forecast is None:
+            return JSONResponse(status_code=202, content={"status": "training", "staleness": staleness})
+        return {"status": "ready", "staleness": staleness, **forecast}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting forecast: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """Hit/miss counters and usage of the storage, response and institution caches"""
+    return {
+        "storage": data_storage.cache_stats(),
+        "responses": response_cache.stats(),
+        "analytics": analytics_frames.stats(),
+        "institutions": institution_cache.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Request, Plaid, storage and cache metrics in the Prometheus text exposition format"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def require_profile_token(request: Request) -> None:
+    """Allow the profile endpoints only with the configured X-Profile-Token"""
+    if not profile_token:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not ProfilingMiddleware.authorized_token(request.headers, profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+@app.get("/profiles", dependencies=[Depends(require_profile_token)])
+async def list_profiles():
+    """Stored request profiles, newest first"""
+    return {"profiles": await call_storage(profile_store.list)}
+
+@app.get("/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+async def get_profile(profile_id: str, format: str = "json", sort: str = "cumulative", limit: int = 40):
+    """A stored profile: spans and metadata (json), the top functions as pstats text (text),
+    or the raw pstats file for snakeviz and friends (prof)"""
+    if format == "prof":
+        path = profile_store.prof_path(profile_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="No cProfile data for this profile")
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    if format == "text":
+        if sort not in ("cumulative", "tottime", "calls"):
+            raise HTTPException(status_code=400, detail="sort must be 'cumulative', 'tottime' or 'calls'")
+        report = await call_storage(profile_store.report, profile_id, sort, limit)
+        if report is None:
+            raise HTTPException(status_code=404, detail="No cProfile data for this profile")
+        return PlainTextResponse(report)
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be 'json', 'text' or 'prof'")
+    profile = await call_storage(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
 @app.post("/clean_test_data")
 async def clean_test_data(user_id: Optional[str] = None):
     """Clean out test data. If user_id is provided, only clean that user's data."""
     try:
-        data_storage.clean_test_data(user_id)
+        await call_storage(data_storage.clean_test_data, user_id)
         return {"message": "Test data cleaned successfully"}
     except Exception as e:
         logger.error(f"Error cleaning test data: {str(e)}")
@@ -0,0 +1,312 @@
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format served by /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from a cached read to a slow Plaid page
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Size buckets in bytes, 1 KiB to 1 GiB in powers of four
+SIZE_BUCKETS = tuple(float(1024 * 4 ** i) for i in range(11))
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class Registry:
+    """The set of metrics rendered by /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric") -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One broken collector should not take the whole endpoint down
+                logger.error(f"Error rendering metric {metric.name}: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """Base class for a named metric with a fixed set of label names.
+
+    Metrics are per process: with several workers, each one serves its own
+    values and the scraper aggregates them.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _label_values(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A monotonically increasing count, per combination of label values"""
+
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        if "le" in self.labelnames:
+            raise ValueError("'le' is reserved for histogram buckets")
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf)) + (math.inf,)
+        # {label values: [per-bucket counts (not cumulative), sum]}
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._label_values(labels)
+        # Buckets are upper bounds, inclusive
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the wall-clock seconds spent in the with-block, even if it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(self._label_values(labels))
+            return sum(entry[0]) if entry is not None else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(entry[0]), entry[1])) for key, entry in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """A gauge or counter whose values are read from a callback at scrape time.
+
+    The callback returns {label values tuple: value}, which suits counters
+    that other objects already keep, such as cache hit/miss stats.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[Tuple[str, ...], float]], type: str = "gauge",
+                 registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.type = type
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.collect().items())]
+
+
+# HTTP requests, recorded by MetricsMiddleware
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request, until the last body byte is sent",
+    ("method", "route", "status"),
+)
+
+# Plaid SDK calls, recorded by InstrumentedClient
+PLAID_REQUEST_SECONDS = Histogram(
+    "plaid_request_duration_seconds", "Latency of Plaid API calls, including failed ones", ("method",),
+)
+PLAID_REQUEST_ERRORS = Counter(
+    "plaid_request_errors_total", "Plaid API calls that raised, by Plaid error code or exception type",
+    ("method", "error"),
+)
+
+# DataStorage phases: load (parse files), filter (select a date range), rollup (category/account
+# totals), aggregate (build a summary), search (text queries), save and compact
+STORAGE_OPERATION_SECONDS = Histogram(
+    "storage_operation_duration_seconds", "Time spent in each DataStorage phase", ("backend", "operation"),
+)
+STORAGE_BYTES = Histogram(
+    "storage_bytes", "Bytes read or written by DataStorage: whole files (file) or serialized rows written (payload)",
+    ("backend", "operation", "kind"), buckets=SIZE_BUCKETS,
+)
+
+# Background forecast training runs, recorded by forecasting.Forecaster
+FORECAST_TRAINING_SECONDS = Histogram(
+    "forecast_training_duration_seconds", "Time from scheduling a user's forecast update to its result being stored",
+    ("status",),
+)
+
+
+class InstrumentedClient:
+    """Proxy an SDK client, timing each public method call and counting the ones that raise.
+
+    error_label maps an exception to the `error` label; it should return a
+    small, fixed set of values (e.g. Plaid error codes). Attributes that are
+    not methods pass straight through.
+    """
+
+    def __init__(self, client: Any, seconds: Histogram = PLAID_REQUEST_SECONDS,
+                 errors: Counter = PLAID_REQUEST_ERRORS,
+                 error_label: Callable[[Exception], str] = lambda e: type(e).__name__):
+        self._client = client
+        self._seconds = seconds
+        self._errors = errors
+        self._error_label = error_label
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        # Keeps the method's __name__, which call_plaid uses to label its profile span
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                self._errors.inc(method=name, error=self._error_label(e))
+                raise
+            finally:
+                self._seconds.observe(time.perf_counter() - started, method=name)
+
+        return call
+
+
+class MetricsMiddleware:
+    """Record the latency of every HTTP request by method, route template and status.
+
+    Routes are labelled by their template (/summary/{user_id}), never the raw
+    path, so the number of series stays bounded; requests that match no route
+    share the label "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram = HTTP_REQUEST_SECONDS) -> None:
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router records the matched route in the (shared) scope
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
@@ -0,0 +1,258 @@
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from async_utils import run_in_executor
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Profile ids are generated here; anything else is not used as a file name
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+# cProfile hooks the interpreter, so only one profiler runs at a time; calls that
+# would overlap another profiled call still get spans, just no cProfile stats
+_profiler_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Span timings (and optionally cProfile stats) collected for one request.
+
+    Spans are recorded from any thread the request's work runs on, since
+    run_in_executor carries the request's context into executor threads.
+    """
+
+    def __init__(self, profile_id: str, use_cprofile: bool = False):
+        self.profile_id = profile_id
+        self.use_cprofile = use_cprofile
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.stats: Optional[pstats.Stats] = None
+        self.skipped_calls = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, started: float, duration: float) -> None:
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                "thread": threading.current_thread().name,
+            })
+
+    def add_stats(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+    def server_timing(self) -> str:
+        """Render span durations, summed per name, as a Server-Timing header value"""
+        with self._lock:
+            totals: Dict[str, List[float]] = {}
+            for span in self.spans:
+                entry = totals.setdefault(span["name"], [0.0, 0])
+                entry[0] += span["duration_ms"]
+                entry[1] += 1
+        parts = [f'{name};dur={duration:.3f};desc="x{count}"' for name, (duration, count) in totals.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """The profile of the request being served, or None if it is not being profiled"""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the with-block as a span of the current request's profile; a no-op when not profiling"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(name, started, time.perf_counter() - started)
+
+
+def run_profiled(func: Callable[..., T], *args, **kwargs) -> T:
+    """Call func, under cProfile if the current request asked for it.
+
+    Profiling is per call rather than per request because a request's work
+    hops between the event loop and executor threads, and cProfile only
+    sees the thread it was enabled on; the calls' stats are merged.
+    """
+    profile = _current.get()
+    if profile is None or not profile.use_cprofile:
+        return func(*args, **kwargs)
+    if not _profiler_lock.acquire(blocking=False):
+        profile.skipped_calls += 1
+        return func(*args, **kwargs)
+    try:
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            profile.add_stats(profiler)
+    finally:
+        _profiler_lock.release()
+
+
+class ProfileStore:
+    """Keeps the most recent request profiles on disk: {id}.json metadata plus {id}.prof pstats data"""
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, profile_id: str, suffix: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id or ""):
+            return None
+        return os.path.join(self.directory, f"{profile_id}{suffix}")
+
+    def save(self, profile: RequestProfile, metadata: Dict[str, Any]) -> None:
+        metadata = {
+            **metadata,
+            "profile_id": profile.profile_id,
+            "spans": profile.spans,
+            "cprofile": profile.stats is not None,
+            "skipped_calls": profile.skipped_calls,
+        }
+        if profile.stats is not None:
+            profile.stats.dump_stats(self._path(profile.profile_id, ".prof"))
+        with open(self._path(profile.profile_id, ".json"), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        self._prune()
+
+    def _prune(self) -> None:
+        profile_ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for profile_id in profile_ids[:-self.max_profiles] if self.max_profiles > 0 else profile_ids:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, f"{profile_id}{suffix}"))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of the stored profiles, newest first, without their spans"""
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(".json"):
+                metadata = self.get(name[:-5])
+                if metadata is not None:
+                    metadata.pop("spans", None)
+                    profiles.append(metadata)
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(profile_id, ".json")
+        if path is None:
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def prof_path(self, profile_id: str) -> Optional[str]:
+        """Path of the raw pstats file (for snakeviz, pstats, ...), or None if there is none"""
+        path = self._path(profile_id, ".prof")
+        return path if path is not None and os.path.exists(path) else None
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 40) -> Optional[str]:
+        """The top `limit` functions of a stored cProfile run as pstats text"""
+        path = self.prof_path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """Profile single requests on demand.
+
+    A request sent with `X-Profile: spans` or `X-Profile: cprofile` and an
+    `X-Profile-Token` matching the configured token records span timings
+    (and, for cprofile, cProfile stats of the work done through
+    run_profiled). Span totals come back in a Server-Timing header and the
+    full profile is stored under the id in the X-Profile-Id header. Without
+    a configured token the headers are ignored.
+    """
+
+    MODES = ("spans", "cprofile")
+
+    def __init__(self, app: ASGIApp, store: ProfileStore, token: Optional[str]) -> None:
+        self.app = app
+        self.store = store
+        self.token = token
+
+    @staticmethod
+    def authorized_token(headers: Headers, token: Optional[str]) -> bool:
+        """True if a token is configured and the request's X-Profile-Token matches it"""
+        return bool(token) and hmac.compare_digest(headers.get("x-profile-token", ""), token)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        mode = headers.get("x-profile", "").lower()
+        if mode not in self.MODES or not self.authorized_token(headers, self.token):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        profile = RequestProfile(profile_id, use_cprofile=mode == "cprofile")
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = MutableHeaders(scope=message)
+                response_headers.append("Server-Timing", profile.server_timing())
+                response_headers.append("X-Profile-Id", profile_id)
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            try:
+                await run_in_executor(None, self.store.save, profile, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(route, "path", None),
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - profile.started) * 1000, 3),
+                    "created": datetime.now().isoformat(),
+                })
+            except OSError as e:
+                logger.error(f"Error saving profile {profile_id}: {str(e)}")
+        logger.info(f"Profiled {scope['method']} {scope['path']} as {profile_id}")
@@ -0,0 +1,80 @@
+import gzip
+import json
+from typing import Any, Dict, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+import logging
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact UTF-8 JSON, with orjson if it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps(), so orjson is used when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def accepts_gzip(headers: Headers) -> bool:
+    return "gzip" in headers.get("accept-encoding", "")
+
+
+class CompressionPolicy:
+    """Per-route gzip settings.
+
+    routes maps a path prefix to the minimum body size worth compressing for
+    paths under it, or None to never compress them; the longest matching
+    prefix wins and other paths use minimum_size.
+    """
+
+    def __init__(self, minimum_size: int = 1024, compresslevel: int = 6,
+                 routes: Optional[Dict[str, Optional[int]]] = None):
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.routes = routes or {}
+
+    def minimum_size_for(self, path: str) -> Optional[int]:
+        """Return the compression threshold for a request path, or None if it is not compressed"""
+        matches = [prefix for prefix in self.routes if path.startswith(prefix)]
+        if not matches:
+            return self.minimum_size
+        return self.routes[max(matches, key=len)]
+
+    def compress(self, body: bytes) -> bytes:
+        return gzip.compress(body, compresslevel=self.compresslevel, mtime=0)
+
+
+class RouteGZipMiddleware:
+    """Gzip responses according to a CompressionPolicy.
+
+    Responses that already set Content-Encoding (e.g. bodies compressed ahead
+    of time and served from a cache) are passed through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, policy: CompressionPolicy) -> None:
+        self.app = app
+        self.policy = policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and accepts_gzip(Headers(scope=scope)):
+            minimum_size = self.policy.minimum_size_for(scope["path"])
+            if minimum_size is not None:
+                responder = GZipResponder(self.app, minimum_size, compresslevel=self.policy.compresslevel)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,87 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Words are runs of letters and digits; punctuation and underscores separate them
+# (as SQLite's unicode61 tokenizer does, so both backends match the same rows)
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased words of text, in order"""
+    return _WORD.findall(text.lower()) if text else []
+
+
+def search_text(transaction: Dict[str, Any]) -> str:
+    """The searchable text of a transaction: its name, merchant name and every category level"""
+    parts = [transaction.get("name"), transaction.get("merchant_name"), *(transaction.get("category") or [])]
+    return " ".join(part for part in parts if isinstance(part, str))
+
+
+class SearchIndex:
+    """Inverted index from words to the ids of the transactions containing them.
+
+    terms is kept sorted, so the words starting with a prefix are one
+    bisect away. Like TransactionRollups, instances are shared through the
+    cache and never mutated; updated() returns a copy that shares the
+    postings of every word the change does not touch.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, FrozenSet[Any]] = {}
+        self.terms: List[str] = []
+
+    @classmethod
+    def build(cls, transactions: Iterable[Dict[str, Any]]) -> "SearchIndex":
+        postings: Dict[str, Set[Any]] = defaultdict(set)
+        for transaction in transactions:
+            transaction_id = transaction.get("transaction_id")
+            for word in set(tokenize(search_text(transaction))):
+                postings[word].add(transaction_id)
+        index = cls()
+        index.postings = {word: frozenset(ids) for word, ids in postings.items()}
+        index.terms = sorted(index.postings)
+        return index
+
+    def updated(self, removed: List[Dict[str, Any]], added: List[Dict[str, Any]]) -> "SearchIndex":
+        """Return a copy with the removed rows' words unindexed and the added rows' words indexed"""
+        changes: Dict[str, Tuple[Set[Any], Set[Any]]] = {}
+        for side, transactions in ((0, removed), (1, added)):
+            for transaction in transactions:
+                transaction_id = transaction.get("transaction_id")
+                for word in set(tokenize(search_text(transaction))):
+                    changes.setdefault(word, (set(), set()))[side].add(transaction_id)
+
+        index = SearchIndex()
+        index.postings = dict(self.postings)
+        vocabulary_changed = False
+        for word, (gone, new) in changes.items():
+            ids = (self.postings.get(word, frozenset()) - gone) | new
+            if ids:
+                vocabulary_changed |= word not in index.postings
+                index.postings[word] = frozenset(ids)
+            elif index.postings.pop(word, None) is not None:
+                vocabulary_changed = True
+        index.terms = sorted(index.postings) if vocabulary_changed else self.terms
+        return index
+
+    def prefixed(self, prefix: str) -> Set[Any]:
+        """Ids of the transactions containing a word that starts with prefix"""
+        ids: Set[Any] = set()
+        i = bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            ids |= self.postings[self.terms[i]]
+            i += 1
+        return ids
+
+    def match(self, query: str) -> Set[Any]:
+        """Ids of the transactions that have, for every word of the query, a word starting with it"""
+        matched: Optional[Set[Any]] = None
+        # Longer prefixes usually match fewer words, so intersect starting from them
+        for term in sorted(set(tokenize(query)), key=len, reverse=True):
+            ids = self.prefixed(term)
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                break
+        return matched or set()
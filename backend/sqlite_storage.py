@@ -0,0 +1,467 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, date
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+import logging
+
+from data_storage import DataStorage, build_account_summary
+from search_index import search_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    user_id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    institution_name TEXT,
+    type TEXT,
+    current_balance REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, account_id)
+);
+CREATE INDEX IF NOT EXISTS idx_accounts_account_id ON accounts (account_id);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    user_id TEXT NOT NULL,
+    transaction_id TEXT NOT NULL,
+    account_id TEXT,
+    date TEXT,
+    amount REAL NOT NULL DEFAULT 0,
+    category TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, transaction_id)
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_id ON transactions (account_id);
+
+CREATE TABLE IF NOT EXISTS items (
+    user_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+# Full-text index over each transaction's name, merchant and categories; rows share the
+# rowid of their transactions row and are written in the same SQL transaction
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE transactions_fts USING fts5(
+    user_id, text, prefix='2 3', tokenize='unicode61 remove_diacritics 0'
+);
+"""
+
+UPSERT_TRANSACTION = (
+    "INSERT INTO transactions (user_id, transaction_id, account_id, date, amount, category, data) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (user_id, transaction_id) DO UPDATE SET account_id = excluded.account_id, "
+    "date = excluded.date, amount = excluded.amount, category = excluded.category, data = excluded.data"
+)
+INDEX_TRANSACTION = (
+    "INSERT OR REPLACE INTO transactions_fts (rowid, user_id, text) "
+    "SELECT rowid, user_id, ? FROM transactions WHERE user_id = ? AND transaction_id = ?"
+)
+UNINDEX_TRANSACTIONS = (
+    "DELETE FROM transactions_fts WHERE rowid IN "
+    "(SELECT rowid FROM transactions WHERE user_id = ? AND transaction_id = ?)"
+)
+
+
+class SQLiteDataStorage(DataStorage):
+    """DataStorage backend that keeps accounts and transactions in a SQLite database.
+
+    Rows are stored with the original Plaid JSON alongside indexed columns, so
+    date-range filtering and per-category/per-account sums run in SQL. The
+    database runs in WAL mode so readers are not blocked by a writer.
+    """
+
+    backend_name = "sqlite"
+
+    def __init__(self, storage_dir: str = "data", db_path: Optional[str] = None):
+        super().__init__(storage_dir)
+        self.db_path = db_path or os.path.join(storage_dir, "banksflow.db")
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'").fetchone() is None:
+                conn.executescript(SEARCH_SCHEMA)
+                self._index_existing_transactions(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _transaction_row(user_id: str, transaction: Dict[str, Any]) -> tuple:
+        transaction_date = transaction.get("date")
+        try:
+            transaction_date = date.fromisoformat(transaction_date).isoformat()
+        except (ValueError, TypeError):
+            logger.warning(f"Error parsing transaction date: {transaction_date!r}")
+            transaction_date = None
+        category = (transaction.get("category") or ["Uncategorized"])[0]
+        return (
+            user_id,
+            transaction.get("transaction_id") or str(uuid.uuid4()),
+            transaction.get("account_id"),
+            transaction_date,
+            float(transaction.get("amount") or 0),
+            category,
+            json.dumps(transaction),
+        )
+
+    @staticmethod
+    def _index_existing_transactions(conn: sqlite3.Connection) -> None:
+        """Fill a newly created search index from the transactions already stored"""
+        rows = [(rowid, user_id, search_text(json.loads(data)))
+                for rowid, user_id, data in conn.execute("SELECT rowid, user_id, data FROM transactions")]
+        with conn:
+            conn.executemany("INSERT INTO transactions_fts (rowid, user_id, text) VALUES (?, ?, ?)", rows)
+        if rows:
+            logger.info(f"Built the search index for {len(rows)} stored transactions")
+
+    def _upsert_transactions(self, conn: sqlite3.Connection, user_id: str,
+                             transactions: List[Dict[str, Any]]) -> List[tuple]:
+        """Upsert transactions by transaction_id and index their text; returns the rows written.
+
+        Upserting in place keeps each row's rowid, which its search index entry shares.
+        """
+        rows = [self._transaction_row(user_id, t) for t in transactions]
+        conn.executemany(UPSERT_TRANSACTION, rows)
+        conn.executemany(INDEX_TRANSACTION, [
+            (search_text(transaction), user_id, row[1]) for transaction, row in zip(transactions, rows)
+        ])
+        return rows
+
+    def get_data_version(self, user_id: str) -> int:
+        """Return the user's data version, which every account/transaction save and every clean increases"""
+        row = self._connect().execute(
+            "SELECT version FROM data_versions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump_version(self, user_id: str, conn: Optional[sqlite3.Connection] = None) -> None:
+        # Run inside the writing transaction so the version and the data commit together
+        (conn or self._connect()).execute(
+            "INSERT INTO data_versions (user_id, version) VALUES (?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            (user_id,),
+        )
+
+    def save_accounts(self, user_id: str, accounts: List[Dict[str, Any]]):
+        """Save account information, keeping accounts that are already stored"""
+        rows = []
+        for account in accounts:
+            account = dict(account)
+            if "institution_name" not in account:
+                account["institution_name"] = "Unknown Institution"
+            account = self._convert_dates_to_strings(account)
+            rows.append((
+                user_id,
+                account.get("account_id"),
+                account["institution_name"],
+                account.get("type", "unknown"),
+                float(account.get("balances", {}).get("current") or 0),
+                json.dumps(account),
+            ))
+
+        conn = self._connect()
+        with self._timed("save"), conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO accounts "
+                "(user_id, account_id, institution_name, type, current_balance, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            new_count = conn.total_changes - before
+            self._bump_version(user_id, conn)
+        self._record_bytes("save", "payload", sum(len(row[-1]) for row in rows))
+        logger.info(f"Saved {new_count} new accounts for user {user_id}")
+
+    def save_transactions(self, user_id: str, transactions: List[Dict[str, Any]]) -> None:
+        """Save transactions for a user, upserting them by transaction_id into the stored history"""
+        transactions = self._convert_dates_to_strings(transactions)
+        conn = self._connect()
+        try:
+            with self._timed("save"), conn:
+                rows = self._upsert_transactions(conn, user_id, transactions)
+                self._bump_version(user_id, conn)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving transactions: {str(e)}")
+            raise
+        self._record_bytes("save", "payload", sum(len(row[-1]) for row in rows))
+        logger.info(f"Saved {len(rows)} transactions for user {user_id}")
+
+    def save_item(self, user_id: str, item: Dict[str, Any]) -> None:
+        """Save a linked Plaid item, replacing one with the same item_id"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO items (user_id, item_id, data) VALUES (?, ?, ?)",
+                (user_id, item.get("item_id"), json.dumps(item)),
+            )
+
+    def update_item_cursor(self, user_id: str, item_id: str, cursor: Optional[str]) -> None:
+        """Record the transactions/sync cursor reached for an item"""
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT data FROM items WHERE user_id = ? AND item_id = ?", (user_id, item_id)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown item {item_id} for user {user_id}")
+            item = json.loads(row[0])
+            item["cursor"] = cursor
+            item["last_synced"] = datetime.now().isoformat()
+            conn.execute(
+                "UPDATE items SET data = ? WHERE user_id = ? AND item_id = ?",
+                (json.dumps(item), user_id, item_id),
+            )
+
+    def get_items(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get a user's linked Plaid items, including their access tokens and sync cursors"""
+        cursor = self._connect().execute(
+            "SELECT data FROM items WHERE user_id = ? ORDER BY rowid", (user_id,)
+        )
+        return [json.loads(row[0]) for row in cursor]
+
+    def apply_transaction_changes(self, user_id: str, added: List[Dict[str, Any]], modified: List[Dict[str, Any]],
+                                  removed: List[str]) -> Dict[str, int]:
+        """Apply a transactions/sync delta: upsert added and modified rows by transaction_id and drop removed ones"""
+        conn = self._connect()
+        with self._timed("save"), conn:
+            rows = self._upsert_transactions(
+                conn, user_id, self._convert_dates_to_strings(list(added) + list(modified))
+            )
+            keys = [(user_id, transaction_id) for transaction_id in removed]
+            conn.executemany(UNINDEX_TRANSACTIONS, keys)
+            before = conn.total_changes
+            conn.executemany("DELETE FROM transactions WHERE user_id = ? AND transaction_id = ?", keys)
+            removed_count = conn.total_changes - before
+            # An empty delta leaves the data, and so every cached response, as it was
+            if rows or removed_count:
+                self._bump_version(user_id, conn)
+        self._record_bytes("save", "payload", sum(len(row[-1]) for row in rows))
+        return {"added": len(added), "modified": len(modified), "removed": removed_count}
+
+    def get_accounts(self, user_id: str) -> List[Dict[str, Any]]:
+        cursor = self._connect().execute(
+            "SELECT data FROM accounts WHERE user_id = ? ORDER BY rowid", (user_id,)
+        )
+        return [json.loads(row[0]) for row in cursor]
+
+    @staticmethod
+    def _date_filter(start_date: Optional[date], end_date: Optional[date]) -> tuple:
+        if not start_date or not end_date:
+            return "", ()
+        return " AND date BETWEEN ? AND ?", (start_date.isoformat(), end_date.isoformat())
+
+    def get_transactions(self, user_id: str, start_date: date = None, end_date: date = None) -> List[Dict[str, Any]]:
+        """Get transactions for a user within the specified date range, newest first"""
+        clause, params = self._date_filter(start_date, end_date)
+        try:
+            # The query reads and filters in one step, so it counts as filtering
+            with self._timed("filter"):
+                cursor = self._connect().execute(
+                    "SELECT data FROM transactions WHERE user_id = ?" + clause +
+                    " ORDER BY date IS NULL, date DESC, transaction_id DESC",
+                    (user_id, *params),
+                )
+                return [json.loads(row[0]) for row in cursor]
+        except sqlite3.Error as e:
+            logger.error(f"Unexpected error reading transactions: {str(e)}")
+            return []
+
+    def iter_transactions(self, user_id: str, start_date: date, end_date: date,
+                          after: Optional[Tuple[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a user's transactions within the date range, newest first, reading rows in batches.
+
+        The generator may be resumed from different threads (e.g. by a streaming
+        response), so it uses its own connection rather than the thread-local one.
+        """
+        clause, params = self._date_filter(start_date, end_date)
+        if after is not None:
+            clause += " AND (date < ? OR (date = ? AND transaction_id < ?))"
+            params += (after[0], after[0], after[1])
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        try:
+            cursor = conn.execute(
+                "SELECT data FROM transactions WHERE user_id = ?" + clause +
+                " ORDER BY date DESC, transaction_id DESC",
+                (user_id, *params),
+            )
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.loads(row[0])
+        finally:
+            conn.close()
+
+    def search_transactions(self, user_id: str, query: str, start_date: date = None, end_date: date = None,
+                            min_amount: float = None, max_amount: float = None, limit: int = 50,
+                            after: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """Find transactions with a word starting with each word of query in their name, merchant or category.
+
+        Answered by the FTS5 index with prefix queries, newest first; see
+        DataStorage.search_transactions.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Quoted, so query words are never read as FTS5 syntax; the user_id phrase narrows
+        # the match to this user's rows before the join
+        match = " AND ".join('text : "' + term.replace('"', '""') + '"*' for term in terms)
+        if tokenize(user_id):
+            match = 'user_id : "' + user_id.replace('"', '""') + '" AND ' + match
+        clause, params = "", []
+        for condition, value in (("t.date >= ?", start_date and start_date.isoformat()),
+                                 ("t.date <= ?", end_date and end_date.isoformat()),
+                                 ("t.amount >= ?", min_amount), ("t.amount <= ?", max_amount)):
+            if value is not None:
+                clause += f" AND {condition}"
+                params.append(value)
+        if after is not None:
+            clause += " AND (t.date < ? OR (t.date = ? AND t.transaction_id < ?))"
+            params += [after[0], after[0], after[1]]
+        with self._timed("search"):
+            cursor = self._connect().execute(
+                "SELECT t.data FROM transactions_fts JOIN transactions t ON t.rowid = transactions_fts.rowid "
+                "WHERE transactions_fts MATCH ? AND t.user_id = ? AND t.date IS NOT NULL" + clause +
+                " ORDER BY t.date DESC, t.transaction_id DESC LIMIT ?",
+                (match, user_id, *params, limit),
+            )
+            return [json.loads(row[0]) for row in cursor]
+
+    def _sum_transactions(self, user_id: str, group_column: str,
+                          start_date: date = None, end_date: date = None) -> Dict[Any, Dict[str, Any]]:
+        """Sum transaction amounts and counts per value of group_column within the date range"""
+        if group_column not in ("category", "account_id"):
+            raise ValueError(f"Cannot group transactions by {group_column}")
+        clause, params = self._date_filter(start_date, end_date)
+        cursor = self._connect().execute(
+            f"SELECT {group_column}, SUM(amount), COUNT(*) FROM transactions "
+            f"WHERE user_id = ?{clause} GROUP BY {group_column}",
+            (user_id, *params),
+        )
+        return {key: {"total_amount": total, "count": count} for key, total, count in cursor}
+
+    def get_transaction_totals(self, user_id: str, start_date: date = None,
+                               end_date: date = None) -> Dict[str, Dict[Any, Dict[str, Any]]]:
+        """Get transaction totals and counts per category and per account_id within the date range"""
+        with self._timed("rollup"):
+            return {
+                "category": self._sum_transactions(user_id, "category", start_date, end_date),
+                "account_id": self._sum_transactions(user_id, "account_id", start_date, end_date),
+            }
+
+    def get_account_totals(self, user_id: str, start_date: date = None, end_date: date = None) -> Dict[str, Dict[str, Any]]:
+        """Get transaction totals and counts per account_id within the date range"""
+        return self._sum_transactions(user_id, "account_id", start_date, end_date)
+
+    def get_account_summary(self, user_id: str, start_date: date = None, end_date: date = None,
+                            detail: str = "full", include_ids: bool = False, top: int = 0) -> Dict[str, Any]:
+        """Get account summary information for the specified date range.
+
+        A lean summary without transaction IDs or top transactions is answered
+        from SQL sums alone, without loading any transaction rows.
+        """
+        try:
+            accounts = self.get_accounts(user_id)
+            with self._timed("rollup"):
+                category_totals = self._sum_transactions(user_id, "category", start_date, end_date)
+                account_totals = self.get_account_totals(user_id, start_date, end_date) if detail == "lean" else None
+            if detail != "lean" or include_ids or top:
+                transactions = self.get_transactions(user_id, start_date, end_date)
+            else:
+                transactions = []
+            with self._timed("aggregate"):
+                return build_account_summary(accounts, transactions, category_totals, account_totals,
+                                             detail=detail, include_ids=include_ids, top=top)
+        except Exception as e:
+            logger.error(f"Error getting summary: {str(e)}")
+            raise
+
+    def clean_test_data(self, user_id: str = None) -> None:
+        """Clean out test data. If user_id is provided, only clean that user's data."""
+        try:
+            conn = self._connect()
+            with conn:
+                if user_id:
+                    conn.execute("DELETE FROM transactions_fts WHERE rowid IN "
+                                 "(SELECT rowid FROM transactions WHERE user_id = ?)", (user_id,))
+                else:
+                    conn.execute("DELETE FROM transactions_fts")
+                for table in ("accounts", "transactions", "items"):
+                    if user_id:
+                        conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+                    else:
+                        conn.execute(f"DELETE FROM {table}")
+                # Versions are kept so a version number is never reused for other data
+                if user_id:
+                    self._bump_version(user_id, conn)
+                else:
+                    conn.execute("UPDATE data_versions SET version = version + 1")
+            logger.info(f"Removed data for {'user ' + user_id if user_id else 'all users'}")
+        except Exception as e:
+            logger.error(f"Error cleaning test data: {str(e)}")
+            raise
+
+
+def migrate_json_to_sqlite(json_dir: str = "data", db_path: Optional[str] = None) -> Dict[str, int]:
+    """Copy every user's JSON account, transaction and item files into a SQLite database.
+
+    Existing accounts are kept and migrated transactions are upserted by
+    transaction_id. Returns counts of what was migrated.
+    """
+    source = DataStorage(json_dir)
+    target = SQLiteDataStorage(json_dir, db_path)
+
+    user_ids = set()
+    suffixes = ("_accounts.json", "_transactions.json", "_transactions.ndjson", "_transactions.log", "_items.json")
+    for filename in os.listdir(json_dir):
+        for suffix in suffixes:
+            if filename.endswith(suffix):
+                user_ids.add(filename[:-len(suffix)])
+
+    counts = {"users": 0, "accounts": 0, "transactions": 0}
+    for user_id in sorted(user_ids):
+        accounts = source.get_accounts(user_id)
+        transactions = source.get_transactions(user_id)
+        if accounts:
+            target.save_accounts(user_id, accounts)
+        if transactions:
+            target.save_transactions(user_id, transactions)
+        for item in source.get_items(user_id):
+            target.save_item(user_id, item)
+        counts["users"] += 1
+        counts["accounts"] += len(accounts)
+        counts["transactions"] += len(transactions)
+        logger.info(f"Migrated {len(accounts)} accounts and {len(transactions)} transactions for user {user_id}")
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Migrate JSON data files into the SQLite storage backend")
+    parser.add_argument("--json-dir", default="data", help="directory holding the {user_id}_*.json files")
+    parser.add_argument("--db-path", default=None, help="SQLite database path (default: <json-dir>/banksflow.db)")
+    args = parser.parse_args()
+    print(migrate_json_to_sqlite(args.json_dir, args.db_path))
@@ -0,0 +1,99 @@
+"""Deterministic generators for Plaid-shaped accounts and transactions."""
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+INSTITUTIONS = ["Chase", "Wells Fargo", "Bank of America", "TD Canada Trust", "RBC Royal Bank"]
+ACCOUNT_TYPES = [("depository", "checking"), ("depository", "savings"), ("credit", "credit card")]
+CATEGORIES = [
+    ["Food and Drink", "Restaurants"],
+    ["Food and Drink", "Coffee Shop"],
+    ["Shops", "Supermarkets and Groceries"],
+    ["Travel", "Airlines and Aviation Services"],
+    ["Travel", "Taxi"],
+    ["Transfer", "Payroll"],
+    ["Payment", "Credit Card"],
+    ["Recreation", "Gyms and Fitness Centers"],
+    ["Service", "Subscription"],
+]
+MERCHANTS = [
+    "Starbucks", "Uber", "United Airlines", "McDonald's", "Whole Foods", "Netflix",
+    "Amazon", "Shell", "Costco", "Touchstone Climbing", "SparkFun", "KFC",
+]
+
+
+def generate_accounts(num_accounts: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate accounts spread over a handful of institutions"""
+    rng = random.Random(seed)
+    accounts = []
+    for i in range(num_accounts):
+        acc_type, subtype = ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)]
+        current = round(rng.uniform(100, 20000), 2)
+        accounts.append({
+            "account_id": f"acc_{seed}_{i:04d}",
+            "name": f"Plaid {subtype.title()}",
+            "official_name": f"Plaid {subtype.title()} Account",
+            "mask": f"{rng.randrange(10000):04d}",
+            "type": acc_type,
+            "subtype": subtype,
+            "balances": {
+                "available": current,
+                "current": current,
+                "iso_currency_code": "USD",
+                "limit": 5000.0 if acc_type == "credit" else None,
+                "unofficial_currency_code": None,
+            },
+            "institution_name": INSTITUTIONS[i % len(INSTITUTIONS)],
+        })
+    return accounts
+
+
+def generate_transactions(accounts: List[Dict[str, Any]], count: int, years: float = 5,
+                          end_date: date = None, seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate count transactions spread uniformly over the given number of years"""
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    days = max(int(365 * years), 1)
+    transactions = []
+    for i in range(count):
+        account = accounts[rng.randrange(len(accounts))]
+        merchant = rng.choice(MERCHANTS)
+        category = rng.choice(CATEGORIES)
+        transactions.append({
+            "transaction_id": f"txn_{seed}_{i:08d}",
+            "account_id": account["account_id"],
+            "amount": round(rng.uniform(-500, 500), 2),
+            "iso_currency_code": "USD",
+            "date": (end_date - timedelta(days=rng.randrange(days))).isoformat(),
+            "name": f"{merchant} #{rng.randrange(1000)}",
+            "merchant_name": merchant,
+            "category": list(category),
+            "category_id": f"{13000000 + CATEGORIES.index(category)}",
+            "payment_channel": rng.choice(["in store", "online", "other"]),
+            "pending": False,
+            "transaction_type": "place",
+        })
+    return transactions
+
+
+def generate_dataset(num_users: int, accounts_per_user: int, years: float, transactions_per_month: int = 30,
+                     end_date: date = None, seed: int = 0) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """Generate N users x M accounts x Y years of data: {user_id: {"accounts": [...], "transactions": [...]}}.
+
+    Each account gets about transactions_per_month transactions per month of
+    history, and each user has its own seed, so users do not share ids.
+    """
+    dataset = {}
+    for user in range(num_users):
+        user_seed = seed * 1000 + user
+        accounts = generate_accounts(accounts_per_user, seed=user_seed)
+        count = transactions_per_user(accounts_per_user, years, transactions_per_month)
+        dataset[f"bench_user_{user:03d}"] = {
+            "accounts": accounts,
+            "transactions": generate_transactions(accounts, count, years=years, end_date=end_date, seed=user_seed),
+        }
+    return dataset
+
+
+def transactions_per_user(accounts_per_user: int, years: float, transactions_per_month: int) -> int:
+    return max(int(accounts_per_user * years * 12 * transactions_per_month), 1)
@@ -0,0 +1,101 @@
+import os
+import tempfile
+
+import pytest
+
+# main reads its configuration at import time
+os.environ.setdefault("PLAID_CLIENT_ID", "test")
+os.environ.setdefault("PLAID_SECRET", "test")
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp(prefix="test_refresh_")
+
+import main
+from data_storage import DataStorage
+from fake_plaid import FakePlaidClient
+from fastapi.testclient import TestClient
+from response_cache import ResponseCache
+from sqlite_storage import SQLiteDataStorage
+
+USER_ID = "refresh_user"
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def app(request, tmp_path, monkeypatch):
+    storage = DataStorage(str(tmp_path)) if request.param == "json" else SQLiteDataStorage(str(tmp_path))
+    fake = FakePlaidClient(num_transactions=600, num_accounts=2, years=1, seed=5)
+    scheduled = []
+    monkeypatch.setattr(main, "data_storage", storage)
+    monkeypatch.setattr(main, "plaid_client", fake)
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    monkeypatch.setattr(main, "schedule_forecast", scheduled.append)
+    storage.save_item(USER_ID, {"item_id": fake.item_id, "access_token": "access-test",
+                                "institution_name": "Fake Bank", "cursor": None})
+    return TestClient(main.app), storage, fake, scheduled
+
+
+def refresh(client):
+    response = client.post(f"/refresh/{USER_ID}")
+    assert response.status_code == 200
+    [item] = response.json()["items"]
+    return item
+
+
+def stored_amounts(storage):
+    return {t["transaction_id"]: t["amount"] for t in storage.get_transactions(USER_ID)}
+
+
+def fake_amounts(fake):
+    return {t["transaction_id"]: t["amount"] for t in fake.transactions}
+
+
+def test_first_refresh_pages_through_history(app):
+    client, storage, fake, scheduled = app
+
+    item = refresh(client)
+
+    assert (item["added"], item["modified"], item["removed"]) == (600, 0, 0)
+    assert item["pages"] == 2
+    assert stored_amounts(storage) == fake_amounts(fake)
+    assert storage.get_items(USER_ID)[0]["cursor"] == "600"
+    assert scheduled == [USER_ID]
+
+
+def test_refresh_applies_added_modified_and_removed(app):
+    client, storage, fake, scheduled = app
+    refresh(client)
+    first, second, third = (t["transaction_id"] for t in fake.transactions[:3])
+
+    fake.add_transactions(2)
+    fake.modify_transaction(first, amount=12.34)
+    fake.remove_transaction(second)
+    # Modified and then removed within one delta: the removal wins
+    fake.modify_transaction(third, amount=56.78)
+    fake.remove_transaction(third)
+    # Added and then removed within one delta: never stored
+    [pending] = fake.add_transactions(1)
+    fake.remove_transaction(pending["transaction_id"])
+    item = refresh(client)
+
+    assert (item["added"], item["modified"], item["removed"]) == (3, 2, 3)
+    stored = stored_amounts(storage)
+    assert stored == fake_amounts(fake)
+    assert stored[first] == 12.34
+    assert second not in stored and third not in stored and pending["transaction_id"] not in stored
+    assert scheduled == [USER_ID, USER_ID]
+
+
+def test_refresh_without_changes(app):
+    client, storage, fake, scheduled = app
+    refresh(client)
+    version = storage.get_data_version(USER_ID)
+
+    item = refresh(client)
+
+    assert (item["pages"], item["added"], item["modified"], item["removed"]) == (1, 0, 0, 0)
+    assert storage.get_data_version(USER_ID) == version
+    assert scheduled == [USER_ID]
+
+
+def test_refresh_without_items(app):
+    client, _, _, _ = app
+
+    assert client.post("/refresh/nobody").status_code == 404
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from fake_plaid import FakePlaidClient
+from transaction_ingest import fetch_all_transactions
+
+START = date.today() - timedelta(days=365 * 3)
+END = date.today()
+
+
+def test_fetches_every_page():
+    client = FakePlaidClient(num_transactions=1234, num_accounts=2, years=2, seed=7)
+    pages = []
+
+    transactions, stats = fetch_all_transactions(
+        client, "access-test", START, END, page_size=500,
+        on_page=lambda fetched, total: pages.append((fetched, total))
+    )
+
+    assert sorted(t["transaction_id"] for t in transactions) == sorted(t["transaction_id"] for t in client.transactions)
+    assert stats["total_transactions"] == 1234
+    assert stats["transactions"] == 1234
+    assert stats["duplicates"] == 0
+    assert stats["pages"] == 3
+    assert client.calls["transactions_get"] == 3
+    assert pages == [(1, 3), (2, 3), (3, 3)]
+
+
+class ShiftingPlaidClient(FakePlaidClient):
+    """Posts a new transaction after the first page, shifting later pages by one row"""
+
+    def transactions_get(self, request):
+        response = super().transactions_get(request)
+        if self.calls["transactions_get"] == 1:
+            self.add_transactions(1, days_back=1)
+        return response
+
+
+def test_overlapping_pages_are_deduplicated():
+    client = ShiftingPlaidClient(num_transactions=1100, num_accounts=2, years=2, seed=3)
+    original_ids = {t["transaction_id"] for t in client.transactions}
+
+    transactions, stats = fetch_all_transactions(client, "access-test", START, END, page_size=500, max_workers=1)
+
+    ids = [t["transaction_id"] for t in transactions]
+    assert len(ids) == len(set(ids))
+    # The second page starts one row earlier, repeating the first page's last row
+    assert stats["total_transactions"] == 1100
+    assert stats["duplicates"] == 1
+    assert stats["transactions"] == 1100
+    assert set(ids) == original_ids
@@ -0,0 +1,157 @@
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Summaries fall back to walking the row dicts
+    np = None
+
+# The interned columns, and how each row's value is read; category is the first level, as the summary groups it
+DIMENSIONS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "account_id": lambda t: t.get("account_id"),
+    "category": lambda t: (t.get("category") or ["Uncategorized"])[0],
+}
+
+
+def _encode(values: Iterable[Any], count: int, known: Tuple[Any, ...] = ()) -> Tuple["np.ndarray", List[Any]]:
+    """Intern values into integer codes, after the already `known` ones; return (codes, values in code order)"""
+    lookup: Dict[Any, int] = {value: code for code, value in enumerate(known)}
+    codes = np.fromiter((lookup.setdefault(value, len(lookup)) for value in values), dtype=np.int32, count=count)
+    return codes, list(lookup)
+
+
+def _rows_array(rows: List[Any]) -> "np.ndarray":
+    array = np.empty(len(rows), dtype=object)
+    array[:] = rows
+    return array
+
+
+def _splice(column: "np.ndarray", drop: List[int], before: List[int], values: "np.ndarray") -> "np.ndarray":
+    """Copy of column without the rows at `drop`, with values[k] placed before row before[k].
+
+    Positions index column; before is ascending. Built from slices with one
+    concatenate, as np.delete takes a much slower masking path on object arrays.
+    """
+    events = sorted([(position, 0, k) for k, position in enumerate(before)] + [(position, 1, 0) for position in drop])
+    pieces, start = [], 0
+    for position, is_drop, k in events:
+        pieces.append(column[start:position])
+        if is_drop:
+            start = position + 1
+        else:
+            pieces.append(values[k:k + 1])
+            start = position
+    pieces.append(column[start:])
+    return np.concatenate(pieces)
+
+
+class TransactionTable:
+    """Columnar copy of a TransactionIndex's dated rows.
+
+    Rows keep the index's ascending (date, transaction_id) order, so a date
+    range is a contiguous slice found by binary search. Amounts and date
+    ordinals are NumPy arrays; account_id and category (first level, as the
+    summary groups it) are integer codes into interned value lists, so
+    group-bys are stable sorts. The row dicts themselves are only gathered
+    for the positions a response includes. Tables are shared through the
+    cache and never mutated; updated() returns a spliced copy.
+    """
+
+    def __init__(self, transactions: List[Dict[str, Any]], ordinals: List[int]):
+        count = len(transactions)
+        self.rows = _rows_array(transactions)
+        self.ids = _rows_array([t.get("transaction_id") for t in transactions])
+        self.ordinals = np.fromiter(ordinals, dtype=np.int32, count=count)
+        self.amounts = np.fromiter((float(t.get("amount") or 0) for t in transactions), dtype=np.float64, count=count)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.values: Dict[str, List[Any]] = {}
+        for dimension, value in DIMENSIONS.items():
+            self.codes[dimension], self.values[dimension] = _encode(map(value, transactions), count)
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def updated(self, removed: List[int], inserted: List[Tuple[int, int, Dict[str, Any]]]) -> "TransactionTable":
+        """Return a copy without the rows at the `removed` positions and with each (position, ordinal, row)
+        of `inserted` at that position of the result.
+
+        Only the inserted rows are read; the columns are copied slice by
+        slice rather than rebuilt row by row.
+        """
+        inserted = sorted(inserted, key=lambda item: item[0])
+        rows = [row for _, _, row in inserted]
+        drop = sorted(removed)
+        # The k-th insert lands at its position among the kept rows (result position - k);
+        # translate that to the row of this table it goes before
+        before = []
+        for k, (position, _, _) in enumerate(inserted):
+            row = position - k
+            for dropped in drop:
+                if dropped > row:
+                    break
+                row += 1
+            before.append(row)
+
+        def splice(column: "np.ndarray", values: "np.ndarray") -> "np.ndarray":
+            return _splice(column, drop, before, values)
+
+        table = TransactionTable.__new__(TransactionTable)
+        table.rows = splice(self.rows, _rows_array(rows))
+        table.ids = splice(self.ids, _rows_array([t.get("transaction_id") for t in rows]))
+        table.ordinals = splice(self.ordinals, np.array([ordinal for _, ordinal, _ in inserted], dtype=np.int32))
+        table.amounts = splice(self.amounts, np.array([float(t.get("amount") or 0) for t in rows], dtype=np.float64))
+        table.codes, table.values = {}, {}
+        for dimension, value in DIMENSIONS.items():
+            codes, table.values[dimension] = _encode(map(value, rows), len(rows), tuple(self.values[dimension]))
+            table.codes[dimension] = splice(self.codes[dimension], codes)
+        return table
+
+    def slice(self, start_date: date, end_date: date) -> "TransactionSlice":
+        """The rows dated within [start_date, end_date]"""
+        lo = int(np.searchsorted(self.ordinals, start_date.toordinal(), side="left"))
+        hi = int(np.searchsorted(self.ordinals, end_date.toordinal(), side="right"))
+        return TransactionSlice(self, lo, max(lo, hi))
+
+
+class TransactionSlice:
+    """A date range of a TransactionTable"""
+
+    def __init__(self, table: TransactionTable, lo: int, hi: int):
+        self.table = table
+        self.lo = lo
+        self.hi = hi
+
+    def __len__(self) -> int:
+        return self.hi - self.lo
+
+    def positions(self, dimension: str) -> Dict[Any, "np.ndarray"]:
+        """Table positions of the slice's rows per value of dimension, in ascending (date, id) order"""
+        codes = self.table.codes[dimension][self.lo:self.hi]
+        if not len(codes):
+            return {}
+        order = np.argsort(codes, kind="stable")
+        grouped = codes[order]
+        cuts = np.flatnonzero(np.diff(grouped)) + 1
+        values = self.table.values[dimension]
+        firsts = grouped[np.concatenate(([0], cuts))]
+        return {values[code]: group for code, group in zip(firsts.tolist(), np.split(order + self.lo, cuts))}
+
+    def rows_at(self, positions: "np.ndarray") -> List[Dict[str, Any]]:
+        return self.table.rows[positions].tolist()
+
+    def ids_at(self, positions: "np.ndarray") -> List[Any]:
+        return self.table.ids[positions].tolist()
+
+    def amount_at(self, positions: "np.ndarray") -> float:
+        return float(self.table.amounts[positions].sum())
+
+
+def newest_first(groups: List["np.ndarray"]) -> "np.ndarray":
+    """Merge ascending position arrays into one array ordered newest first"""
+    if len(groups) == 1:
+        return groups[0][::-1]
+    return np.sort(np.concatenate(groups))[::-1]
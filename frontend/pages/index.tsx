@@ -125,13 +125,35 @@ export default function Home() {
         start_date: finalStartDate,
         end_date: finalEndDate
       });
-      return response.data;
+      toast({
+        title: 'Account connected',
+        description: `Downloading transactions from ${response.data.institution_name}...`,
+        status: 'info',
+        duration: 5000,
+        isClosable: true,
+      });
+
+      // 交易记录由后台任务下载，轮询任务状态直到完成
+      // 最多等待 10 分钟
+      const maxPolls = 600;
+      let job = (await axios.get(`http://127.0.0.1:8000/jobs/${response.data.job_id}`)).data;
+      for (let polls = 0; job.status === 'queued' || job.status === 'running'; polls++) {
+        if (polls >= maxPolls) {
+          throw new Error('Timed out waiting for transactions to download');
+        }
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await axios.get(`http://127.0.0.1:8000/jobs/${response.data.job_id}`)).data;
+      }
+      if (job.status !== 'succeeded') {
+        throw new Error(`Failed to download transactions: ${job.error || job.status}`);
+      }
+      return { ...response.data, job };
     },
     {
       onSuccess: (data) => {
         toast({
           title: 'Success',
-          description: `Successfully connected account from ${data.institution_name}`,
+          description: `Imported ${data.job.progress.rows_saved} transactions from ${data.institution_name}`,
           status: 'success',
           duration: 5000,
           isClosable: true,
@@ -149,7 +171,7 @@ export default function Home() {
         console.error('Token exchange error:', error);
         toast({
           title: 'Error',
-          description: error.response?.data?.detail || 'Failed to connect account',
+          description: error.response?.data?.detail || error.message || 'Failed to connect account',
           status: 'error',
           duration: 5000,
           isClosable: true,